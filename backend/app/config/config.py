@@ -1,3 +1,5 @@
+from typing import Dict, List, Tuple
+
 from pydantic_settings import BaseSettings
 
 
@@ -8,18 +10,78 @@ class Settings(BaseSettings):
     environment: str = "PROD"
     geoloc_data_path: str
 
+    # LOGGING
+    LOG_LEVEL: str = "INFO"
+    # event name -> fraction of records kept, eg. LOG_SAMPLE_RATES='{"elo_update": 0.1}'
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+
     # INTERVAL TASKS
-    QUEUEING_TICK: int = 3
+    # seconds the matcher waits after being woken to batch players joining together
+    QUEUEING_COALESCE_WINDOW: float = 0.02
     HEARTBEAT_INTERVAL: int = 10
-    LEADERBOARD_INTERVAL: int = 600
-    ZOMBIE_SWEEPER_INTERVAL: int = 3
+    # full rescan of the players collection, live results keep ranks current in between
+    LEADERBOARD_INTERVAL: int = 3600
+    # seconds of silence (no frames, no pongs) before a connection is reaped
+    LIVENESS_TIMEOUT: int = 30
+
+    # INBOUND RATE LIMITS
+    # message type -> (messages per second, burst) per connection, "*" covers
+    # every other type, eg. INBOUND_RATE_LIMITS='{"chat": [0.5, 3], "*": [2, 5]}'
+    INBOUND_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+        "answer": (2, 4),
+        "quit": (1, 2),
+        "chat": (1, 5),
+        "ping": (1, 3),
+        "pong": (1, 3),
+        "*": (2, 5),
+    }
+
+    # seconds the event loop may be blocked before the stack gets sampled
+    LOOP_LAG_THRESHOLD: float = 0.1
+
+    # networks (not addresses) remembered by the GeoIP lookup
+    GEOIP_CACHE_SIZE: int = 20_000
 
     # ELO Calculation
     K_FACTOR_DEFAULT: int = 32
     MIN_ELO: int = 100
 
+    # DATABASE
+    # "firestore", or "fake" for an in-memory stand-in (offline runs, benchmarks)
+    FIRESTORE_BACKEND: str = "firestore"
+    # per round trip delay and failure injection of the fake
+    FAKE_FIRESTORE_LATENCY: float = 0.0
+    FAKE_FIRESTORE_JITTER: float = 0.0
+    FAKE_FIRESTORE_FAILURE_RATE: float = 0.0
+    # players generated into the fake at startup
+    FAKE_FIRESTORE_PLAYERS: int = 0
+
+    # AUTH
+    AUTH_VERIFY_WORKERS: int = 4
+    AUTH_TOKEN_CACHE_SIZE: int = 10_000
+    # uids allowed on the /admin endpoints, eg. ADMIN_UIDS='["uid1", "uid2"]'
+    ADMIN_UIDS: List[str] = []
+
+    # PLAYER PROFILE CACHE
+    PROFILE_CACHE_SIZE: int = 10_000
+    PROFILE_CACHE_TTL: int = 600
+
+    # MATCH RESULT WRITE-BEHIND
+    RESULT_FLUSH_INTERVAL: float = 0.5
+    RESULT_MAX_RETRIES: int = 5
+
+    # SHARED STATE
+    # "local" keeps players, queue and sessions in-process (single worker),
+    # "shared" keeps them on the state hub so several workers can run
+    STATE_BACKEND: str = "local"
+    STATE_SOCKET_PATH: str = "/tmp/trividuel-state.sock"
+
     # QUESTIONS
     QUESTION_SET_PATH: str
+    # compiled bank mapped at startup, defaults to QUESTION_SET_PATH with a .qbank suffix
+    QUESTION_BANK_PATH: str = ""
+    # seconds between checks of the CSV and bank for changes to hot reload, 0 disables
+    QUESTION_WATCH_INTERVAL: float = 5.0
 
     class Config:
         env_file = ".env"
@@ -9,15 +9,37 @@ from google.cloud.firestore_v1 import AsyncClient
 from app.config import settings
 from app.schemas import player_types
 from app.utils.country_search import find_country_by_ip
-
-# Initialise Firebase Admin SDK
-firebase_admin.initialize_app(
-    credentials.Certificate(settings.google_application_credentials),
-    {"projectId": settings.firebase_project_id},
+from app.utils.fake_firestore import FakeFirestore
+from app.utils.metrics import FIRESTORE_LOAD_PLAYER
+from app.utils.profile_cache import ProfileCache
+from app.utils.result_writer import ResultWriter
+
+db: AsyncClient | FakeFirestore
+if settings.FIRESTORE_BACKEND == "fake":
+    # no credentials or network needed, with injectable latency and failures
+    db = FakeFirestore(
+        latency=settings.FAKE_FIRESTORE_LATENCY,
+        jitter=settings.FAKE_FIRESTORE_JITTER,
+        failure_rate=settings.FAKE_FIRESTORE_FAILURE_RATE,
+    )
+    db.seed_players(settings.FAKE_FIRESTORE_PLAYERS, player_types)
+else:
+    # Initialise Firebase Admin SDK
+    firebase_admin.initialize_app(
+        credentials.Certificate(settings.google_application_credentials),
+        {"projectId": settings.firebase_project_id},
+    )
+
+    db = AsyncClient(project=settings.firebase_project_id, database="trividuel-db")
+
+profile_cache = ProfileCache(settings.PROFILE_CACHE_SIZE, settings.PROFILE_CACHE_TTL)
+
+result_writer = ResultWriter(
+    db,
+    flush_interval=settings.RESULT_FLUSH_INTERVAL,
+    max_retries=settings.RESULT_MAX_RETRIES,
 )
 
-db = AsyncClient(project=settings.firebase_project_id, database="trividuel-db")
-
 
 async def create_doc_ref(document: str, collection: str = "players"):
     return db.collection(collection).document(document)
@@ -50,13 +72,25 @@ def extract_client_ip(obj: Request | WebSocket) -> str:
 
 
 async def fetch_or_create_player(user, client_ip) -> Dict:
+    """
+    Return the player's profile, creating it on first login.
+    Served from the profile cache for returning players, concurrent calls
+    for the same uid share one database read.
+    """
+    pdata = await profile_cache.load(
+        user["uid"], lambda: _load_or_create_player(user, client_ip)
+    )
+    # hand out a copy so callers can't mutate the cached profile
+    return dict(pdata)
+
+
+async def _load_or_create_player(user, client_ip) -> Dict:
     uid = user["uid"]
     doc_ref = await create_doc_ref(uid)
-    snapshot = await doc_ref.get()
+    with FIRESTORE_LOAD_PLAYER.time():
+        snapshot = await doc_ref.get()
 
-    if snapshot.exists:
-        pdata = snapshot.to_dict()
-    else:
+    if not snapshot.exists:
         pdata = {
             "uid": uid,
             "elo": 1200,
@@ -66,15 +100,25 @@ async def fetch_or_create_player(user, client_ip) -> Dict:
             "country": find_country_by_ip(client_ip),
         }
         await doc_ref.set(pdata)
-
-    # adding new fields for Player
-    for field, default in {
-        "country": find_country_by_ip(client_ip),
-        "total_won": 0,
-    }.items():
-        if not pdata.get(field):
-            pdata[field] = default
-
-    await doc_ref.set(pdata)
+        return pdata
+
+    pdata = snapshot.to_dict()
+
+    # adding new fields for Player, only written back if something was missing
+    missing = {}
+    if not pdata.get("country"):
+        missing["country"] = find_country_by_ip(client_ip)
+    if pdata.get("total_won") is None:
+        missing["total_won"] = 0
+
+    if missing:
+        pdata.update(missing)
+        await doc_ref.update(missing)
+
+    # results of the player's last games may still be on their way to the
+    # database, rate the next game from them rather than the stored elo
+    unsaved = result_writer.pending(uid)
+    if unsaved:
+        pdata.update(unsaved)
 
     return pdata
@@ -1,6 +1,5 @@
 import asyncio
 import time
-from contextlib import suppress
 
 from dotenv import load_dotenv
 from fastapi import (
@@ -11,91 +10,131 @@ from fastapi import (
     WebSocketDisconnect,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.websockets import WebSocketState
 
 import app.routers.info as info
 from app.config import settings
-from app.db import db, extract_client_ip, fetch_or_create_player
+from app.db import extract_client_ip, fetch_or_create_player, result_writer
 from app.dependencies.auth import get_current_user
 from app.routers import info_router, player_router
-from app.schemas import player_manager
+from app.schemas import leaderboard, player_manager, scheduler
 from app.schemas.gamesession import GameSession, SessionManager
+from app.schemas.liveness import LivenessMonitor
 from app.schemas.matchmaking import MatchmakingQueue
 from app.schemas.players import Player
-from app.utils.prepare_questions import load_questions_from_csv
+from app.schemas.protocol import negotiate
+from app.schemas.rate_limit import InboundLimiter
+from app.state.backend import StateBackend
+from app.state.shared import SharedStateBackend
+from app.utils.log import configure_logging, get_logger, shutdown_logging
+from app.utils.loop_monitor import LoopLagMonitor
+from app.utils.metrics import Gauge
+from app.utils.prepare_questions import (
+    bank_loaded,
+    load_question_bank,
+    watch_question_bank,
+)
+
+# json lines written from a background thread, never from the event loop
+configure_logging(settings.LOG_LEVEL, settings.LOG_SAMPLE_RATES)
+log = get_logger("main")
 
 match_queue = MatchmakingQueue()
 
 session_manager = SessionManager()
 
+# presence, queue and session routing, on a hub shared with the other workers
+# when running more than one
+state_backend: StateBackend = (
+    SharedStateBackend(
+        player_manager,
+        match_queue,
+        session_manager,
+        settings.STATE_SOCKET_PATH,
+        settings.QUEUEING_COALESCE_WINDOW,
+    )
+    if settings.STATE_BACKEND == "shared"
+    else StateBackend(
+        player_manager, match_queue, session_manager, settings.QUEUEING_COALESCE_WINDOW
+    )
+)
 
-def _debug_print() -> None:
-    if player_manager._players:
-        print("Active Players:\n", player_manager._players.values())
-    if session_manager._sessions:
-        print("Active Sessions:\n", session_manager._sessions.keys())
-    if match_queue._queue:
-        print("Active Queueing:\n", match_queue._queue)
-
+# read at scrape time, per worker (with the shared backend the queue is on the hub)
+Gauge("trividuel_queue_depth", "Players waiting for a match", lambda: len(match_queue))
+Gauge(
+    "trividuel_sessions",
+    "Games in progress on this worker",
+    lambda: len(session_manager),
+)
+Gauge(
+    "trividuel_players", "Players connected to this worker", lambda: len(player_manager)
+)
 
-async def zombie_sweeper_loop() -> None:
-    """
-    Remove zombie players who can't connect because
-    Reload bug where they click play and instantly reload to create
-    a ghost player in queue which blocks them from further playing
-    """
-    while True:
-        try:
-            zombies = []
-            for p in player_manager._players.values():
-                try:
-                    await p.ws.send_json({"type": "zombie"})
-                except Exception:
-                    zombies.append(p)
+liveness = LivenessMonitor(settings.HEARTBEAT_INTERVAL, settings.LIVENESS_TIMEOUT)
 
-            for p in zombies:
-                await match_queue.remove(p)
-                player_manager.remove(p.uid)
+loop_monitor = LoopLagMonitor(settings.LOOP_LAG_THRESHOLD)
 
-            await asyncio.sleep(settings.ZOMBIE_SWEEPER_INTERVAL)
 
-        except Exception:
-            # when players reload sometimes the player queue doesn't
-            # update quick enough and cause dict error,
-            # just ignore to keep the process running
-            continue
+def _debug_print() -> None:
+    log.debug(
+        "debug_state",
+        players=list(player_manager._players),
+        sessions=list(session_manager._sessions),
+        queued=list(match_queue._queue),
+    )
 
 
 async def matchmaker_loop() -> None:
-    """Background coroutine that continually pairs players."""
+    """Background coroutine that pairs players as soon as a pair is available."""
+    # no games until there are questions to ask
+    await bank_loaded.wait()
     while True:
+        # sleeps until the queue can make a pair, so an idle server never wakes up.
+        # every pair available is drained, starting a game only schedules its
+        # first phase so a busy queue is not throttled to one game per wakeup
+        pairs = await state_backend.next_pairs()
         # _debug_print()
-        pair = await match_queue.pop_pair()
-        if pair:
-            p1, p2 = pair
-            session = GameSession(p1, p2, db)
+        for p1, p2 in pairs:
+            session = GameSession(p1, p2)
             session_manager.add(session)
             await session.start()
 
-        # matchmaking tick
-        await asyncio.sleep(settings.QUEUEING_TICK)
+
+async def question_bank_loop() -> None:
+    """Background coroutine loading the question bank, then reloading it on change."""
+    csv_path, bank_path = settings.QUESTION_SET_PATH, settings.QUESTION_BANK_PATH
+    try:
+        await load_question_bank(csv_path, bank_path or None)
+    except Exception:
+        # matchmaking stays closed, the watcher may still pick up a fixed CSV
+        log.exception("question_bank_load_failed", source=csv_path)
+    if settings.QUESTION_WATCH_INTERVAL > 0:
+        await watch_question_bank(
+            csv_path, bank_path or None, settings.QUESTION_WATCH_INTERVAL
+        )
 
 
 async def leaderboard_loop() -> None:
-    """Background coroutine to get the latest leaderboard updates"""
+    """
+    Background coroutine reconciling the live leaderboard with the database.
+    Match results keep it current in between, this only catches drift.
+    """
     while True:
         try:
-            new_df = await info.fetch_global_stats()
-            async with info.leaderboard_lock:
-                info.global_df = new_df
-                info.last_updated_ts = time.time()
-            print("Leaderboard refreshed:", len(info.global_df), "players")
-        except Exception as exc:
-            print("Leaderboard refresh failed:", exc)
+            started = time.perf_counter()
+            await info.refresh_leaderboard()
+            log.info(
+                "leaderboard_reconciled",
+                players=len(leaderboard),
+                seconds=round(time.perf_counter() - started, 3),
+            )
+        except Exception:
+            log.exception("leaderboard_refresh_failed")
         await asyncio.sleep(settings.LEADERBOARD_INTERVAL)
 
 
 app = FastAPI()
+app.state.backend = state_backend
+app.state.loop_monitor = loop_monitor
 app.include_router(player_router)
 app.include_router(info_router)
 
@@ -112,10 +151,17 @@ app.add_middleware(
 async def _startup():
     load_dotenv()
 
-    print("Trividuel Starting")
+    log.info("startup", state_backend=settings.STATE_BACKEND)
+
+    # catch anything that blocks the loop and stalls every game's timers
+    loop_monitor.start()
 
-    # load the start up questions
-    asyncio.create_task(load_questions_from_csv(settings.QUESTION_SET_PATH))
+    # reach the state hub before taking players
+    await state_backend.start()
+
+    # map the compiled question bank, matchmaking is refused until it is loaded.
+    # later edits of the CSV are swapped in without dropping any game
+    asyncio.create_task(question_bank_loop())
 
     # start the queueing system for players to play
     asyncio.create_task(matchmaker_loop())
@@ -123,8 +169,24 @@ async def _startup():
     # loading leaderboard locally for fetching
     asyncio.create_task(leaderboard_loop())
 
-    # Sweep and remove zombie players
-    asyncio.create_task(zombie_sweeper_loop())
+    # ping idle connections and reap the dead ones (eg. ghost players left
+    # behind by a reload right after clicking play)
+    asyncio.create_task(liveness.run())
+
+    # drive every session's phase timers from one loop
+    asyncio.create_task(scheduler.run())
+
+    # commit finished games' results in the background
+    asyncio.create_task(result_writer.run())
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    # don't lose the results of games that just finished
+    await result_writer.close()
+    await state_backend.close()
+    loop_monitor.stop()
+    shutdown_logging()
 
 
 @app.websocket("/play")
@@ -138,20 +200,40 @@ async def websocket_endpoint(ws: WebSocket, token: str = Query(...)):
         await ws.close(code=4401)
         return
 
+    if not bank_loaded.is_set():
+        # accept first, a close code can only be sent over an open socket
+        await ws.accept()
+        await ws.send_text("Server is starting up, try again shortly.")
+        await ws.close(code=4503)
+        return
+
     # default data guarenteed to exist in firebase
     uid = user["uid"]
     display_name = user["name"]
 
-    if player_manager.get(uid):
+    if not await state_backend.claim(uid):
         await ws.send_text("You are already connected from another session.")
         await ws.close(code=4401)
         return
 
-    await ws.accept()
-    print(f"new connection from {display_name}")
+    # compact binary frames for clients offering the msgpack subprotocol, json otherwise
+    subprotocol, codec = negotiate(ws.scope.get("subprotocols", []))
 
-    ip = extract_client_ip(ws)
-    pdata = await fetch_or_create_player(user, ip)
+    try:
+        await ws.accept(subprotocol=subprotocol)
+
+        ip = extract_client_ip(ws)
+        started = time.perf_counter()
+        pdata = await fetch_or_create_player(user, ip)
+        log.info(
+            "player_connected",
+            uid=uid,
+            name=display_name,
+            profile_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+    except Exception:
+        await state_backend.release(uid)
+        raise
 
     player = Player(
         uid=uid,
@@ -161,50 +243,55 @@ async def websocket_endpoint(ws: WebSocket, token: str = Query(...)):
         elo=pdata["elo"],
         country=pdata["country"],
         name=display_name,
+        codec=codec,
     )
 
     # add player to the player manager
     player_manager.add(player)
 
     # Automatically enqueue for matchmaking
-    await match_queue.add(player)
-    await ws.send_json({"type": "queue", "message": "start"})
+    await state_backend.enqueue(player)
+    player.conn.send_json({"type": "queue", "message": "start"})
 
-    async def heartbeat():
-        try:
-            while True:
-                await asyncio.sleep(settings.HEARTBEAT_INTERVAL)
-                await ws.send_json({"type": "ping"})
-        except Exception as e:
-            print("ERROR:", e)
-            await disconnect()
+    async def ping():
+        if not player.conn.send(codec.ping):
+            raise ConnectionError("send queue closed")
+
+    limiter = InboundLimiter(settings.INBOUND_RATE_LIMITS)
+    disconnected = False
 
     async def disconnect():
-        await match_queue.remove(player)
-        session = session_manager.get_by_player(uid)
-        if session:
-            await session.handle_disconnect(uid)
-            session_manager.remove(session.id)
+        # reached from both the receive loop and the liveness monitor
+        nonlocal disconnected
+        if disconnected:
+            return
+        disconnected = True
+        if limiter.dropped:
+            log.warning("inbound_rate_limited", uid=uid, dropped=limiter.dropped)
+
+        liveness.unregister(uid)
+        await state_backend.dequeue(player)
+        await state_backend.leave(uid)
         player_manager.remove(uid)
-        heartbeat_task.cancel()
-        # try to close the extra connection & suppress the logs to keep terminal clean
-        if ws.application_state is not WebSocketState.DISCONNECTED:
-            with suppress(RuntimeError):
-                await ws.close()
+        await state_backend.release(uid)
+        await player.conn.close()
 
-    # Start heartbeat in background
-    heartbeat_task = asyncio.create_task(heartbeat())
+    liveness.register(uid, ping, disconnect)
 
     try:
         while True:
-            data = await ws.receive_json()
+            data = await codec.receive(ws)
+            # any inbound frame (answers, pongs, chat) proves the client is alive
+            liveness.touch(uid)
+            # a flooding client is throttled here, before its messages reach
+            # a session and fan out to the other player
+            if not isinstance(data, dict) or not limiter.allow(data.get("type")):
+                continue
             # send user message to the game if the user sends
-            session = session_manager.get_by_player(uid)
-            if session:
-                await session.handle_client_message(uid, data)
+            await state_backend.route(uid, data)
 
     except WebSocketDisconnect:
         await disconnect()
-    except Exception as e:
-        print(f"Unexpected error: {e}")
+    except Exception:
+        log.exception("play_loop_error", uid=uid)
         await disconnect()
@@ -1,90 +1,72 @@
 import asyncio
-import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import pandas as pd
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 
-from app.db import db
-from app.dependencies.auth import get_current_user
+from app.config import settings
+from app.db import db, result_writer
+from app.dependencies.auth import get_admin_user, get_current_user
 from app.routers.player import extract_client_ip
-from app.schemas import player_manager
+from app.schemas import leaderboard
+from app.utils import metrics, prepare_questions
 from app.utils.country_search import find_country_by_ip
 
 router = APIRouter(
     tags=["info"],
 )
 
-global global_df
-global_df = []
+# serialises full rescans, so a cold start and the background loop don't both stream
 leaderboard_lock = asyncio.Lock()
-last_updated_ts = 0
+# the one cold start rescan every concurrent first request waits on
+_cold_start: Optional[asyncio.Task] = None
 
 
-async def get_snapshot() -> pd.DataFrame:
+async def fetch_global_stats() -> List[Dict]:
     """
-    Safe read-only copy for request handlers.
-    Starts an immediate fetch if snapshot is still None (cold start).
+    Pull every player document.
+    Expected fields in each doc: uid, display_name, elo, country (ISO-2 or 'IDK')
     """
-    global global_df
-    async with leaderboard_lock:
-        if global_df is None:
-            global_df = await fetch_global_stats()
-        return global_df.copy()
-
-
-def build_response(df: pd.DataFrame, uid: str, country: str) -> Dict:
-    # Global ranking
-    df["rank"] = range(1, len(df) + 1)
-    top10 = df.head(10)[
-        ["uid", "display_name", "elo", "country", "rank", "total_won"]
-    ].to_dict("records")
-    me_row = df.loc[df["uid"] == uid]
-    my_global_rank = int(me_row["rank"].iloc[0]) if not me_row.empty else None
-
-    # Regional ranking
-    regional_df = df.loc[df["country"] == country]
-    regional_df = regional_df.reset_index(drop=True)
-    regional_df["rank"] = range(1, len(regional_df) + 1)
-    top10_reg = regional_df.head(10)[
-        ["uid", "display_name", "elo", "rank", "total_won"]
-    ].to_dict("records")
-    my_reg_rank = (
-        int(regional_df.loc[regional_df["uid"] == uid]["rank"].iloc[0])
-        if uid in regional_df["uid"].values
-        else None
-    )
-
-    return {
-        "global_top10": top10,
-        "global_rank": my_global_rank,
-        "regional_top10": top10_reg,
-        "regional_rank": my_reg_rank,
-        "region": country,
-        "last_update": int((time.time() - last_updated_ts) // 60),
-    }
+    docs = db.collection("players").stream()
+    with metrics.FIRESTORE_STREAM_PLAYERS.time():
+        return [doc.to_dict() | {"uid": doc.id} async for doc in docs]
 
 
-async def fetch_global_stats() -> pd.DataFrame:
+async def refresh_leaderboard(cold: bool = False) -> None:
     """
-    Pull every player document into a DataFrame.
-    Expected fields in each doc: uid, display_name, elo, country (ISO-2 or 'IDK')
+    Reconcile the live leaderboard against a full rescan of the players collection.
+    Results recorded while the rescan streams are kept. A `cold` refresh is
+    skipped if the leaderboard got loaded while waiting for the lock.
     """
-    docs = db.collection("players").stream()
-    players: List[Dict] = [doc.to_dict() | {"uid": doc.id} async for doc in docs]
-    df = pd.DataFrame(players)
-
-    # basic hygiene
-    df["elo"] = pd.to_numeric(df["elo"], errors="coerce").fillna(0).astype(int)
-    df["country"] = df["country"].str.upper().fillna("IDK")
-    return df.sort_values("elo", ascending=False).reset_index(drop=True)
+    async with leaderboard_lock:
+        if cold and leaderboard.loaded:
+            return
+        with metrics.LEADERBOARD_REFRESH.time():
+            leaderboard.begin_reconcile(result_writer.uncommitted())
+            try:
+                players = await fetch_global_stats()
+            except Exception:
+                leaderboard.reconcile_aborted()
+                raise
+            leaderboard.reconcile(players)
+
+
+async def ensure_leaderboard_loaded() -> None:
+    """Cold start: concurrent first requests share one rescan, and its failure."""
+    global _cold_start
+    if leaderboard.loaded:
+        return
+    if _cold_start is None or _cold_start.done():
+        _cold_start = asyncio.ensure_future(refresh_leaderboard(cold=True))
+    await asyncio.shield(_cold_start)
 
 
 @router.get("/leaderboard")
 async def get_leaderboard(request: Request, user=Depends(get_current_user)) -> Dict:
     """
-    Returns cached leaderboards plus the caller's ranks.
-    Refresh happens asynchronously every 10 min in the background task.
+    Returns the live leaderboards plus the caller's ranks.
+    Match results update it as they happen, the background task reconciles
+    it against the database every `LEADERBOARD_INTERVAL`.
     """
     uid = user["uid"]
 
@@ -92,16 +74,60 @@ async def get_leaderboard(request: Request, user=Depends(get_current_user)) -> D
     ip = extract_client_ip(request)
     country = find_country_by_ip(ip) or "IDK"
 
-    df = await get_snapshot()
-    return build_response(df, uid, country)
+    # cold start - build the leaderboard before the first answer
+    await ensure_leaderboard_loaded()
+    return leaderboard.build_response(uid, country)
 
 
 @router.get("/ingamecount")
-async def get_ingamecount(_=Depends(get_current_user)) -> Dict:
+async def get_ingamecount(request: Request, _=Depends(get_current_user)) -> Dict:
+    """
+    Count and return the amount of players in game (queueing + playing),
+    across every worker
+    """
+    return {"total": await request.app.state.backend.online_count()}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """
+    Prometheus scrape endpoint, the counters of this worker
+    """
+    return metrics.render()
+
+
+@router.get("/debug/loop")
+async def get_loop_stalls(
+    request: Request, reset: bool = False, _=Depends(get_admin_user)
+) -> Dict:
     """
-    Count and return the amount of players in game (queueing + playing)
+    Event loop stalls of this worker and the stacks that caused them,
+    `reset` starts a fresh profile after reading this one. Admins only,
+    the stacks expose server file paths
     """
-    return {"total": len(player_manager._players)}
+    monitor = request.app.state.loop_monitor
+    report = monitor.report()
+    if reset:
+        monitor.reset()
+    return report
+
+
+@router.post("/admin/questions/reload")
+async def reload_questions(_=Depends(get_admin_user)) -> Dict:
+    """
+    Recompile and swap in the question bank on this worker, games in progress
+    keep their questions. Other workers pick up the new bank file on their watcher
+    """
+    try:
+        await prepare_questions.load_question_bank(
+            settings.QUESTION_SET_PATH, settings.QUESTION_BANK_PATH or None
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {
+        "version": prepare_questions.bank_version,
+        "questions": len(prepare_questions.QUESTION_BANK),
+    }
 
 
 @router.get("/health")
@@ -3,7 +3,12 @@ from typing import Dict
 
 from fastapi import APIRouter, Depends, Request, status
 
-from app.db import create_doc_ref, extract_client_ip, fetch_or_create_player
+from app.db import (
+    create_doc_ref,
+    extract_client_ip,
+    fetch_or_create_player,
+    profile_cache,
+)
 from app.dependencies.auth import get_current_user
 from app.schemas import player_manager, player_types
 
@@ -44,4 +49,5 @@ async def change_type(request: Request, user: dict = Depends(get_current_user))
 
     # Update only the `type` field
     await doc_ref.update({"type": new_type})
+    profile_cache.update(uid, type=new_type)
     return {"message": new_type}
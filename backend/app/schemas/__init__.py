@@ -1,7 +1,13 @@
 from typing import List
 
+from app.schemas.leaderboard import Leaderboard
 from app.schemas.players import PlayerManager
+from app.schemas.scheduler import SessionScheduler
 
 player_types: List[str] = ["businessman", "skeleton", "witch", "elf", "janitor"]
 
 player_manager = PlayerManager()
+
+leaderboard = Leaderboard()
+
+scheduler = SessionScheduler()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from contextlib import suppress
+from typing import Dict, Optional, Protocol, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+from app.schemas.protocol import JSON, Codec, Frame
+from app.utils.log import get_logger
+from app.utils.metrics import SEND_LATENCY
+
+log = get_logger("connection")
+
+# close code sent to a client that can't keep up with its frames
+SLOW_CONSUMER_CLOSE_CODE = 4408
+
+
+class PlayerConnection(Protocol):
+    """What a session needs of a player's connection, whichever worker holds the socket."""
+
+    codec: Codec
+
+    def send(self, frame: Frame) -> bool: ...
+
+    def send_json(self, payload: Dict) -> bool: ...
+
+    async def close(self, code: int = 1000) -> None: ...
+
+
+class Connection:
+    """
+    Outbound side of a player's websocket.
+    `send` only enqueues, a single writer task per connection drains the queue,
+    so one slow socket never holds up frames meant for the other players.
+    A client that lets its bounded queue overflow is dropped.
+    Frames are encoded with the `codec` negotiated for the socket.
+    """
+
+    MAX_PENDING = 64
+
+    def __init__(
+        self,
+        ws: Optional[WebSocket],
+        max_pending: int = MAX_PENDING,
+        codec: Codec = JSON,
+    ):
+        self.ws = ws
+        self.codec = codec
+        # (frame, queued at)
+        self._queue: asyncio.Queue[Tuple[Frame, float]] = asyncio.Queue(max_pending)
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.overflowed = False
+
+    def send(self, frame: Frame) -> bool:
+        """Queue an encoded frame, returns False if the connection is gone."""
+        if self.closed:
+            return False
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        try:
+            self._queue.put_nowait((frame, time.monotonic()))
+        except asyncio.QueueFull:
+            # slow consumer - drop it rather than buffering without bound
+            self.overflowed = True
+            asyncio.create_task(self.close(SLOW_CONSUMER_CLOSE_CODE))
+            return False
+        return True
+
+    def send_json(self, payload: Dict) -> bool:
+        return self.send(self.codec.encode(payload))
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame, queued_at = await self._queue.get()
+                if self.ws.application_state is WebSocketState.DISCONNECTED:
+                    break
+                if isinstance(frame, bytes):
+                    await self.ws.send_bytes(frame)
+                else:
+                    await self.ws.send_text(frame)
+                SEND_LATENCY.observe(time.monotonic() - queued_at)
+        except (RuntimeError, OSError, WebSocketDisconnect):
+            # socket went away underneath us, the receive loop cleans up
+            pass
+        except Exception:
+            log.exception("connection_writer_error")
+        finally:
+            self.closed = True
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        # try to close the connection & suppress the logs to keep terminal clean
+        if self.ws and self.ws.application_state is not WebSocketState.DISCONNECTED:
+            with suppress(RuntimeError):
+                await self.ws.close(code=code)
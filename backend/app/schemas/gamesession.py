@@ -1,63 +1,99 @@
-import asyncio
+import time
 import uuid
-from contextlib import suppress
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
-from google.cloud.firestore_v1 import AsyncClient
-from starlette.websockets import WebSocketState
-
-from app.db import create_doc_ref
+from app.db import profile_cache, result_writer
+from app.schemas import leaderboard, scheduler
 from app.schemas.players import Player
+from app.schemas.protocol import Codec, Frame
 from app.utils.elo import elo_calculation
+from app.utils.log import get_logger
 from app.utils.prepare_questions import Question, get_random_questions
 
+log = get_logger("session")
+
+
+def apply_result(uid: str, fields: Dict):
+    """Make a player's new rating visible to this worker's profile cache and ranking."""
+    profile_cache.update(uid, elo=fields["elo"], total_won=fields["total_won"])
+    # feed the result straight into the live ranking
+    leaderboard.update(uid, **fields)
+
 
 class GameSession:
+    __slots__ = (
+        "id",
+        "created_at",
+        "players",
+        "seats",
+        "lifes",
+        "answers",
+        "answering",
+        "questions",
+        "ans_his",
+        "current_index",
+        "manager",
+        "leaver_uid",
+    )
+
     PLAYER_STARTING_LIFE = 3
     START_GAME_DELAY = 3
     QUESTION_TIMEOUT = 20
     REVEAL_TIME = 3
     QUESTION_COUNT = 10
 
-    def __init__(self, p1: Player, p2: Player, db: AsyncClient):
+    def __init__(self, p1: Player, p2: Player):
         self.id = str(uuid.uuid4())
+        self.created_at = time.monotonic()
         self.players: List[Player] = [p1, p2]
-        for p in self.players:
-            p.session_id = self.id
+        # per-player game state lives in the session, indexed by seat,
+        # so the shared Player objects are never mutated by a game
+        self.seats: Dict[str, int] = {
+            p.uid: seat for seat, p in enumerate(self.players)
+        }
+        self.lifes: List[int] = [self.PLAYER_STARTING_LIFE] * len(self.players)
+        self.answers: List[Optional[int]] = [None] * len(self.players)
+        # only answers to the open question count
+        self.answering = False
 
         self.questions: List[Question] = get_random_questions(self.QUESTION_COUNT)
         self.ans_his: List[Dict] = []
         self.current_index: int = -1
-        self.db = db
-        self.timer_task: Optional[asyncio.Task] = None
+        # set by SessionManager.add, so the session can unregister itself on cleanup
+        self.manager: Optional["SessionManager"] = None
 
         # if a player disconnects the other one will disconnect as well, so we store the first msg
         # of disconnect to bypass subsequent disconnect messages
         self.leaver_uid: str = ""
 
     # ------------------------------------------------------------------ utils
-    async def _safe_send(self, player: Player, payload: Dict):
-        if player.ws.application_state is not WebSocketState.DISCONNECTED:
-            with suppress(RuntimeError):
-                await player.ws.send_json(payload)
+    def _safe_send(self, player: Player, payload: Dict):
+        player.conn.send_json(payload)
 
-    async def broadcast(self, payload: Dict):
-        for p in self.players:
-            await self._safe_send(p, payload)
+    def broadcast(self, payload: Dict):
+        self._broadcast_encoded(lambda codec: codec.encode(payload))
 
-    async def _delayed_next_question(self, delay: int):
-        await asyncio.sleep(delay)
-        await self.next_question()
+    def _broadcast_encoded(self, encode: Callable[[Codec], Frame]):
+        # encode once per wire protocol in use and hand the same frame to every
+        # player's send queue, the per-connection writers push it out concurrently
+        frames: Dict[str, Frame] = {}
+        for p in self.players:
+            codec = p.conn.codec
+            frame = frames.get(codec.name)
+            if frame is None:
+                frame = frames[codec.name] = encode(codec)
+            p.conn.send(frame)
 
     # ------------------------------------------------------- session lifecycle
-    async def start(self):
-        # set players lifes
-        for p in self.players:
-            p.lifes = self.PLAYER_STARTING_LIFE
+    def _lifes_extra(self) -> Dict:
+        return {
+            p.uid: [p.name, self.lifes[seat]] for seat, p in enumerate(self.players)
+        }
 
+    async def start(self):
         # notify both players that game found - for useMatchmaking.js
-        await self.broadcast(
+        self.broadcast(
             {
                 "type": "game",
                 "message": "found",
@@ -66,26 +102,27 @@ class GameSession:
                 },
             }
         )
-        # sleep to await players redirect to room first
-        await asyncio.sleep(1)
+        # give players a second to redirect to the room first
+        scheduler.schedule(self.id, 1, self._announce_start)
+
+    async def _announce_start(self):
         # notify both players that game starts - for GameRoom.jsx
-        await self.broadcast(
+        self.broadcast(
             {
                 "type": "game",
                 "message": "start",
                 "extra": {
                     "players": [p.to_dict() for p in self.players],
-                    "lifes": {p.uid: [p.name, p.lifes] for p in self.players},
+                    "lifes": self._lifes_extra(),
                 },
             }
         )
         # wait 3s then send first question
-        asyncio.create_task(self._delayed_next_question(self.START_GAME_DELAY))
+        scheduler.schedule(self.id, self.START_GAME_DELAY, self.next_question)
 
     async def next_question(self):
         # reset answers
-        for p in self.players:
-            p.current_answer = None
+        self.answers = [None] * len(self.players)
         self.current_index += 1
         if self.current_index >= len(self.questions):
             # out of questions – choose winner by remaining lifes
@@ -93,71 +130,64 @@ class GameSession:
             return
 
         q = self.questions[self.current_index]
-        await self.broadcast(
-            {
-                "type": "game",
-                "message": "question",
-                "extra": {
-                    "index": self.current_index,
-                    "question": q.question,
-                    "choices": q.choices,
-                    "question_timeout": self.QUESTION_TIMEOUT,
-                },
-            }
+        self._broadcast_encoded(
+            lambda codec: codec.encode_question(
+                self.current_index, self.QUESTION_TIMEOUT, q
+            )
         )
-        # start timeout reveal task
-        self.timer_task = asyncio.create_task(self._reveal_after_timeout())
-
-    async def _reveal_after_timeout(self):
-        await asyncio.sleep(self.QUESTION_TIMEOUT)
-        await self.reveal()
+        self.answering = True
+        # reveal on timeout unless both players answer first
+        scheduler.schedule(self.id, self.QUESTION_TIMEOUT, self.reveal)
 
     async def receive_answer(self, uid: str, choice_idx: int):
-        # record answer
-        for p in self.players:
-            if p.uid == uid:
-                p.current_answer = choice_idx
-                break
+        seat = self.seats.get(uid)
+        if seat is None or not self.answering:
+            return
+        self.answers[seat] = choice_idx
         # if both answered early, cancel timer and reveal
-        if all(p.current_answer is not None for p in self.players):
-            if self.timer_task:
-                self.timer_task.cancel()
+        if None not in self.answers:
+            scheduler.cancel(self.id)
             await self.reveal()
 
     async def reveal(self):
+        self.answering = False
         q = self.questions[self.current_index]
         correct = q.answer
         # update lifes
-        for p in self.players:
-            if p.current_answer != correct:
-                p.lifes -= 1
+        for seat, answer in enumerate(self.answers):
+            if answer != correct:
+                self.lifes[seat] -= 1
         # build stats
         extra = {
             "correct": correct,
-            "answers": {p.uid: p.current_answer for p in self.players},
-            "lifes": {p.uid: [p.name, p.lifes] for p in self.players},
+            "answers": {
+                p.uid: self.answers[seat] for seat, p in enumerate(self.players)
+            },
+            "lifes": self._lifes_extra(),
         }
-        await self.broadcast({"type": "game", "message": "reveal", "extra": extra})
+        self.broadcast({"type": "game", "message": "reveal", "extra": extra})
         self.ans_his.append(
             {
                 "index": self.current_index,
                 "question:": q.question,
                 "correct_ans": q.choices[correct],
                 "player_correct": {
-                    p.uid: p.current_answer == correct for p in self.players
+                    p.uid: self.answers[seat] == correct
+                    for seat, p in enumerate(self.players)
                 },
             }
         )
 
         # determine if someone lost
-        losers = [p for p in self.players if p.lifes <= 0]
-        if losers:
-            await asyncio.sleep(self.REVEAL_TIME)
-            await self._end_game("Ran Out of Lifes")
+        if min(self.lifes) <= 0:
+            scheduler.schedule(self.id, self.REVEAL_TIME, self._end_game_out_of_lifes)
             return
 
         # else schedule next question
-        asyncio.create_task(self._delayed_next_question(self.REVEAL_TIME))
+        scheduler.schedule(self.id, self.REVEAL_TIME, self.next_question)
+
+    async def _end_game_out_of_lifes(self):
+        await self._end_game("Ran Out of Lifes")
 
     async def handle_disconnect(self, leaver_uid: str):
         # if this returns true, means we know the leaver already
@@ -165,19 +195,20 @@ class GameSession:
             return
         self.leaver_uid = leaver_uid
 
-        winner: Player = next(p for p in self.players if p.uid != leaver_uid)
-        loser: Player = next(p for p in self.players if p.uid == leaver_uid)
+        leaver_seat = self.seats[leaver_uid]
+        loser: Player = self.players[leaver_seat]
+        winner: Player = self.players[1 - leaver_seat]
 
         winner_new, loser_new, winner_delta, loser_delta = elo_calculation(
             winner, loser
         )
 
-        await self.broadcast(
+        self.broadcast(
             {
                 "type": "game",
                 "message": "end",
                 "extra": {
-                    "winner": next(p.uid for p in self.players if p.uid != leaver_uid),
+                    "winner": winner.uid,
                     "reason": "Opponent Left",
                     "elo_delta": (winner_delta, loser_delta),
                     "questions": self.ans_his,
@@ -185,32 +216,39 @@ class GameSession:
             }
         )
 
-        await self._record_result(winner, loser, winner_new, loser_new)
+        self._record_result(winner, loser, winner_new, loser_new)
 
         await self._cleanup_states()
 
-    async def _record_result(
+    def _record_result(
         self, winner: Player, loser: Player, winner_new: int, loser_new: int
     ):
-        batch = self.db.batch()
+        """Hand the new ratings to the write-behind queue, never waits on the database."""
 
         # calculate the ELO and set winner and loser respectively
-        async def set_elo_and_wins(player, new_elo, win_increment: int = 0):
-            doc = await create_doc_ref(player.uid)
+        def set_elo_and_wins(player, new_elo, win_increment: int = 0):
             payload = {"elo": new_elo, "updated": datetime.utcnow()}
             if win_increment:
                 payload.update({"total_won": player.total_won + 1})
-            batch.set(doc, payload, merge=True)
+            result_writer.submit(player.uid, payload)
 
-        await set_elo_and_wins(winner, winner_new, 1)
-        await set_elo_and_wins(loser, loser_new)
+            fields = {
+                "elo": new_elo,
+                "total_won": player.total_won + win_increment,
+                "display_name": player.name,
+                "country": player.country,
+            }
+            apply_result(player.uid, fields)
+            if self.manager and self.manager.on_result:
+                self.manager.on_result(player.uid, fields)
 
-        await batch.commit()
+        set_elo_and_wins(winner, winner_new, 1)
+        set_elo_and_wins(loser, loser_new)
 
     async def _end_game(self, reason: str):
         # check for tie first
-        if self.players[0].lifes == self.players[1].lifes:
-            await self.broadcast(
+        if self.lifes[0] == self.lifes[1]:
+            self.broadcast(
                 {
                     "type": "game",
                     "message": "end",
@@ -225,16 +263,17 @@ class GameSession:
             await self._cleanup_states()
             return
 
-        winner: Player = max(self.players, key=lambda p: (p.lifes))
-        loser: Player = next(p for p in self.players if p.uid != winner.uid)
+        winner_seat = 0 if self.lifes[0] > self.lifes[1] else 1
+        winner: Player = self.players[winner_seat]
+        loser: Player = self.players[1 - winner_seat]
 
         winner_new, loser_new, winner_delta, loser_delta = elo_calculation(
             winner, loser
         )
 
-        await self._record_result(winner, loser, winner_new, loser_new)
+        self._record_result(winner, loser, winner_new, loser_new)
 
-        await self.broadcast(
+        self.broadcast(
             {
                 "type": "game",
                 "message": "end",
@@ -249,11 +288,20 @@ class GameSession:
         await self._cleanup_states()
 
     async def _cleanup_states(self):
-        # reset state for all players
-        for p in self.players:
-            p.session_id = None
+        # a finished session must never fire another phase
+        scheduler.cancel(self.id)
+        log.info(
+            "session_ended",
+            session_id=self.id,
+            players=[p.uid for p in self.players],
+            questions=self.current_index + 1,
+            leaver=self.leaver_uid or None,
+            seconds=round(time.monotonic() - self.created_at, 1),
+        )
+        self.answering = False
         # TODO: persist stats / ELO if desired
-        SessionManager.remove(self.id)
+        if self.manager:
+            self.manager.remove(self.id)
 
     async def handle_client_message(self, uid: str, data: Dict) -> None:
         """handle all the client json from the ws will be routed here if they're in a game"""
@@ -283,9 +331,11 @@ class GameSession:
         # --------------------------------------------------------
         if msg_type == "ping":
             # { "type": "ping", "id": <any> }
-            sender = next((p for p in self.players if p.uid == uid), None)
-            if sender:
-                await self._safe_send(sender, {"type": "pong", "id": data.get("id")})
+            seat = self.seats.get(uid)
+            if seat is not None:
+                self._safe_send(
+                    self.players[seat], {"type": "pong", "id": data.get("id")}
+                )
             return
         if msg_type == "pong":
             return
@@ -295,16 +345,16 @@ class GameSession:
         if msg_type == "chat":
             # { "type": "chat", "text": "hello" }
             text = (data.get("text") or "")[:500]  # truncate to 500 chars
-            await self.broadcast({"type": "chat", "from": uid, "text": text})
+            self.broadcast({"type": "chat", "from": uid, "text": text})
             return
 
         # --------------------------------------------------------
         # 5.  Unknown message type end an error back to sender
         # --------------------------------------------------------
-        sender = next((p for p in self.players if p.uid == uid), None)
-        if sender:
-            await self._safe_send(
-                sender,
+        seat = self.seats.get(uid)
+        if seat is not None:
+            self._safe_send(
+                self.players[seat],
                 {
                     "type": "error",
                     "message": f"Unknown message type: {msg_type!r}",
@@ -313,19 +363,35 @@ class GameSession:
 
 
 class SessionManager:
-    _sessions: Dict[str, GameSession] = {}
-
-    @classmethod
-    def add(cls, s: GameSession):
-        cls._sessions[s.id] = s
-
-    @classmethod
-    def get_by_player(cls, uid: str) -> Optional[GameSession]:
-        for s in cls._sessions.values():
-            if any(p.uid == uid for p in s.players):
-                return s
-        return None
-
-    @classmethod
-    def remove(cls, sid: str):
-        cls._sessions.pop(sid, None)
+    """Keeps a registry of live sessions, indexed by session id and by player uid."""
+
+    def __init__(self):
+        self._sessions: Dict[str, GameSession] = {}
+        self._by_player: Dict[str, GameSession] = {}
+        # set by a shared state backend, so other workers hear about
+        # sessions ending and results being recorded
+        self.on_remove: Optional[Callable[[GameSession], None]] = None
+        self.on_result: Optional[Callable[[str, Dict], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, s: GameSession):
+        s.manager = self
+        self._sessions[s.id] = s
+        for p in s.players:
+            self._by_player[p.uid] = s
+
+    def get_by_player(self, uid: str) -> Optional[GameSession]:
+        return self._by_player.get(uid)
+
+    def remove(self, sid: str):
+        s = self._sessions.pop(sid, None)
+        if s is None:
+            return
+        for p in s.players:
+            # only drop the route if it still points at this session
+            if self._by_player.get(p.uid) is s:
+                del self._by_player[p.uid]
+        if self.on_remove:
+            self.on_remove(s)
@@ -0,0 +1,170 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+TOP_N = 10
+
+# (-elo, uid) - highest elo first, uid keeps the order total and deterministic
+RankKey = Tuple[int, str]
+
+
+def _clean(record: Dict) -> Dict:
+    """basic hygiene for a raw player document"""
+    try:
+        elo = int(record.get("elo") or 0)
+    except (TypeError, ValueError):
+        elo = 0
+    return {
+        "uid": record["uid"],
+        "display_name": record.get("display_name"),
+        "elo": elo,
+        "country": (record.get("country") or "IDK").upper(),
+        "total_won": int(record.get("total_won") or 0),
+    }
+
+
+def _key(row: Dict) -> RankKey:
+    return (-row["elo"], row["uid"])
+
+
+class Leaderboard:
+    """
+    In-memory ranking kept up to date by match results.
+
+    Players are held in order-statistic sorted lists (one global, one per
+    country), so a result is an O(log n) remove + insert and a rank lookup is
+    an O(log n) index. Top 10 lists are rendered once and only re-rendered
+    when an update touches them.
+
+    The periodic full rescan goes through `begin_reconcile` / `reconcile`:
+    results recorded while the rescan is streaming are replayed on top of it,
+    so a reconciliation never rolls back a fresher in-memory result.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, Dict] = {}
+        self._global: SortedList = SortedList()
+        self._regional: Dict[str, SortedList] = {}
+        # pre-rendered top 10 lists, keyed by country (None for global)
+        self._top: Dict[Optional[str], List[Dict]] = {}
+        self._since_reconcile: Optional[Dict[str, Dict]] = None
+        self.loaded = False
+        self.updated_ts = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ------------------------------------------------------------ bulk loads
+    def begin_reconcile(self, unsaved: Iterable[str] = ()):
+        """
+        Start remembering live updates that a full rescan might miss.
+        `unsaved` players have results not in the database yet, the rescan
+        would read their old documents, so their current rows are kept too.
+        """
+        self._since_reconcile = {
+            uid: self._rows[uid] for uid in unsaved if uid in self._rows
+        }
+
+    def reconcile(self, records: Iterable[Dict]):
+        """Rebuild from a full rescan of the players collection."""
+        rows = {r["uid"]: r for r in map(_clean, records)}
+        rows.update(self._since_reconcile or {})
+        self._since_reconcile = None
+
+        self._rows = rows
+        self._global = SortedList(map(_key, rows.values()))
+        by_country: Dict[str, List[RankKey]] = {}
+        for row in rows.values():
+            by_country.setdefault(row["country"], []).append(_key(row))
+        self._regional = {c: SortedList(keys) for c, keys in by_country.items()}
+        self._top.clear()
+        self.loaded = True
+        self.updated_ts = time.time()
+
+    def reconcile_aborted(self):
+        """The rescan failed, keep serving the live data as is."""
+        self._since_reconcile = None
+
+    # ---------------------------------------------------------- live updates
+    def update(self, uid: str, **fields):
+        """
+        Apply a change (eg. new elo / total_won after a match) to one player.
+        Unknown players are inserted, missing fields fall back to defaults.
+        """
+        old = self._rows.get(uid)
+        row = _clean((old or {"uid": uid}) | fields)
+
+        if old is not None:
+            self._remove(old)
+        self._insert(row)
+        self._rows[uid] = row
+        self.updated_ts = time.time()
+
+        if self._since_reconcile is not None:
+            self._since_reconcile[uid] = row
+
+    def _remove(self, row: Dict):
+        key = _key(row)
+        self._invalidate_top(self._global, key, None)
+        self._global.remove(key)
+        regional = self._regional[row["country"]]
+        self._invalidate_top(regional, key, row["country"])
+        regional.remove(key)
+
+    def _insert(self, row: Dict):
+        key = _key(row)
+        self._global.add(key)
+        self._invalidate_top(self._global, key, None)
+        regional = self._regional.setdefault(row["country"], SortedList())
+        regional.add(key)
+        self._invalidate_top(regional, key, row["country"])
+
+    def _invalidate_top(self, ranked: SortedList, key: RankKey, country):
+        # only changes inside the top N make the rendered list stale
+        if ranked.bisect_left(key) < TOP_N:
+            self._top.pop(country, None)
+
+    # ----------------------------------------------------------------- reads
+    def global_rank(self, uid: str) -> Optional[int]:
+        row = self._rows.get(uid)
+        return self._global.index(_key(row)) + 1 if row else None
+
+    def rank_in_region(self, uid: str, country: str) -> Optional[int]:
+        row = self._rows.get(uid)
+        if row is None or row["country"] != country:
+            return None
+        return self._regional[country].index(_key(row)) + 1
+
+    def top(self, country: Optional[str] = None) -> List[Dict]:
+        if country in self._top:
+            return self._top[country]
+
+        ranked = self._global if country is None else self._regional.get(country)
+        if ranked is None:
+            return []
+        rendered = []
+        for rank, (_, uid) in enumerate(ranked.islice(0, TOP_N), start=1):
+            row = self._rows[uid]
+            entry = {
+                "uid": uid,
+                "display_name": row["display_name"],
+                "elo": row["elo"],
+                "rank": rank,
+                "total_won": row["total_won"],
+            }
+            if country is None:
+                entry["country"] = row["country"]
+            rendered.append(entry)
+        self._top[country] = rendered
+        return rendered
+
+    def build_response(self, uid: str, country: str) -> Dict:
+        return {
+            "global_top10": self.top(),
+            "global_rank": self.global_rank(uid),
+            "regional_top10": self.top(country),
+            "regional_rank": self.rank_in_region(uid, country),
+            "region": country,
+            "last_update": int((time.time() - self.updated_ts) // 60),
+        }
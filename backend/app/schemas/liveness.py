@@ -0,0 +1,115 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class _Conn:
+    __slots__ = ("token", "last_seen", "ping", "on_dead")
+
+    def __init__(self, token: int, ping: Callback, on_dead: Callback):
+        self.token = token
+        self.last_seen = time.monotonic()
+        self.ping = ping
+        self.on_dead = on_dead
+
+
+class LivenessMonitor:
+    """
+    Tracks when each connection was last heard from and reaps the silent ones.
+
+    Inbound frames (including heartbeat pongs) only stamp `last_seen`, the
+    deadline heap is re-armed lazily when an entry comes due. A connection
+    idle for `ping_interval` gets a single ping, one idle for `timeout`
+    is declared dead and its `on_dead` callback runs.
+    """
+
+    def __init__(self, ping_interval: float, timeout: float):
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._conns: Dict[str, _Conn] = {}
+        # (deadline, token, uid) - token invalidates entries of a previous registration
+        self._deadlines: List[Tuple[float, int, str]] = []
+        self._tokens = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    def register(self, uid: str, ping: Callback, on_dead: Callback):
+        conn = _Conn(next(self._tokens), ping, on_dead)
+        self._conns[uid] = conn
+        heapq.heappush(
+            self._deadlines, (conn.last_seen + self.ping_interval, conn.token, uid)
+        )
+        self._wakeup.set()
+
+    def unregister(self, uid: str):
+        # the heap entry is dropped lazily once it comes due
+        self._conns.pop(uid, None)
+
+    def touch(self, uid: str):
+        """Record that a frame was just received from `uid`."""
+        conn = self._conns.get(uid)
+        if conn:
+            conn.last_seen = time.monotonic()
+
+    def last_seen(self, uid: str) -> Optional[float]:
+        conn = self._conns.get(uid)
+        return conn.last_seen if conn else None
+
+    async def run(self):
+        """Single background loop serving every connection's deadlines."""
+        while True:
+            if not self._deadlines:
+                # nothing registered - sleep until someone connects
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._deadlines[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+
+            _, token, uid = heapq.heappop(self._deadlines)
+            conn = self._conns.get(uid)
+            if conn is None or conn.token != token:
+                continue
+            self._check(uid, conn)
+
+    def _check(self, uid: str, conn: _Conn):
+        now = time.monotonic()
+        idle = now - conn.last_seen
+
+        if idle >= self.timeout:
+            self.unregister(uid)
+            asyncio.create_task(self._run_dead(conn))
+            return
+
+        if idle >= self.ping_interval:
+            # silent for a while, nudge the client to answer with a pong
+            asyncio.create_task(self._run_ping(uid, conn))
+            deadline = min(now + self.ping_interval, conn.last_seen + self.timeout)
+        else:
+            deadline = conn.last_seen + self.ping_interval
+        heapq.heappush(self._deadlines, (deadline, conn.token, uid))
+
+    async def _run_ping(self, uid: str, conn: _Conn):
+        try:
+            await conn.ping()
+        except Exception:
+            # the socket can't be written to anymore - no need to wait for the timeout
+            if self._conns.get(uid) is conn:
+                self.unregister(uid)
+                await self._run_dead(conn)
+
+    async def _run_dead(self, conn: _Conn):
+        with suppress(Exception):
+            await conn.on_dead()
@@ -1,44 +1,106 @@
 import asyncio
-from typing import List, Optional
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
 
 from app.schemas.players import Player
+from app.utils.metrics import QUEUE_WAIT
+
+# (elo, arrival order, uid) - the arrival counter breaks elo ties so players
+# of equal rating are matched first come, first served
+QueueKey = Tuple[int, int, str]
 
 
 class MatchmakingQueue:
-    """Simple priority queue ordered roughly by ELO."""
+    """
+    Priority queue ordered by ELO with a uid index for O(log n) add/remove.
+    The matcher sleeps on `wait_for_pair` and is only woken once a pair can be made.
+    """
 
     def __init__(self):
-        self._queue: List[Player] = []
+        self._queue: SortedList = SortedList()
+        self._keys: Dict[str, QueueKey] = {}
+        self._players: Dict[str, Player] = {}
+        # uid -> when they joined, for the time-to-match histogram
+        self._joined: Dict[str, float] = {}
+        self._arrivals = itertools.count()
         self._lock = asyncio.Lock()
+        self._pair_ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def __contains__(self, player: Player) -> bool:
+        return self._players.get(player.uid) is player
 
     async def add(self, player: Player):
         async with self._lock:
-            self._queue.append(player)
-            # keep queue sorted by elo for quick nearest‑neighbour matching
-            self._queue.sort(key=lambda p: p.elo)
+            # re-queueing the same uid replaces the previous entry
+            self._discard(player.uid)
+            key = (player.elo, next(self._arrivals), player.uid)
+            self._queue.add(key)
+            self._keys[player.uid] = key
+            self._players[player.uid] = player
+            self._joined[player.uid] = time.monotonic()
+            self._signal()
 
     async def remove(self, player: Player):
         async with self._lock:
-            if player in self._queue:
-                self._queue.remove(player)
+            if player in self:
+                self._discard(player.uid)
+                self._signal()
+
+    def _signal(self):
+        """Wake the matcher if a pair can be made, otherwise let it sleep."""
+        if len(self._queue) >= 2:
+            self._pair_ready.set()
+        else:
+            self._pair_ready.clear()
 
-    async def pop_pair(self) -> Optional[tuple]:
-        """Return two players that satisfy matching rules, or None."""
+    async def wait_for_pair(self, coalesce: float = 0.0):
+        """
+        Block until at least two players are queued.
+        `coalesce` keeps the door open a little longer so players joining
+        in a burst are matched in the same drain.
+        """
+        await self._pair_ready.wait()
+        if coalesce > 0:
+            await asyncio.sleep(coalesce)
+
+    def _discard(self, uid: str) -> Optional[Player]:
+        key = self._keys.pop(uid, None)
+        if key is None:
+            return None
+        self._queue.remove(key)
+        del self._joined[uid]
+        return self._players.pop(uid)
+
+    def _pop_front(self) -> Player:
+        _, _, uid = self._queue.pop(0)
+        del self._keys[uid]
+        QUEUE_WAIT.observe(time.monotonic() - self._joined.pop(uid))
+        return self._players.pop(uid)
+
+    async def pop_pair(self) -> Optional[Tuple[Player, Player]]:
+        """Return the two lowest rated players (nearest ELO neighbours), or None."""
         async with self._lock:
             if len(self._queue) < 2:
                 return None
+            # matchmaking conditions here: TODO
+            pair = self._pop_front(), self._pop_front()
+            self._signal()
+            return pair
 
-            # iterate pairs until find non‑repeat opponents with closest elo
-            for idx in range(1, len(self._queue)):
-                p1 = self._queue[0]
-                p2 = self._queue[idx]
-                # matchmaking conditions here: TODO
-                # found a pair
-                self._queue.pop(idx)
-                self._queue.pop(0)
-                return p1, p2
-
-            # fallback to first two players (will re‑match repeated opponents if nothing else)
-            p1 = self._queue.pop(0)
-            p2 = self._queue.pop(0)
-            return p1, p2
+    async def pop_pairs(self) -> List[Tuple[Player, Player]]:
+        """
+        Drain every pair the queue can make in one pass.
+        Neighbours in ELO order are paired together, an odd player out stays queued.
+        """
+        async with self._lock:
+            pairs = []
+            while len(self._queue) >= 2:
+                pairs.append((self._pop_front(), self._pop_front()))
+            self._signal()
+            return pairs
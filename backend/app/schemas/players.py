@@ -2,28 +2,35 @@ from typing import Dict, Optional
 
 from fastapi import WebSocket
 
+from app.schemas.connection import Connection, PlayerConnection
+from app.schemas.protocol import JSON, Codec
+
 
 class Player:
-    """Represents a connected player."""
+    """Represents a connected player. Game state is kept by the session they play in."""
+
+    __slots__ = ("uid", "ws", "conn", "type", "total_won", "elo", "name", "country")
 
     def __init__(
         self,
         uid: str,
-        ws: WebSocket,
+        ws: Optional[WebSocket],
         type: str,
         total_won=0,
         elo: int = 1200,
         name: str = "Unknown",
         country: Optional[str] = None,
+        codec: Codec = JSON,
     ):
         self.uid = uid
         self.ws = ws
+        # all outbound frames go through the connection's send queue
+        self.conn: PlayerConnection = Connection(ws, codec=codec)
         self.type = type
         self.total_won = total_won
         self.elo = elo
         self.name = name
         self.country = country
-        self.session_id: Optional[str] = None
 
     def __str__(self):
         return f"{self.name}-{self.elo}"
@@ -47,6 +54,9 @@ class PlayerManager:
     def __init__(self):
         self._players: Dict[str, Player] = {}
 
+    def __len__(self) -> int:
+        return len(self._players)
+
     def add(self, player: Player):
         self._players[player.uid] = player
 
@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import msgpack
+import orjson
+from fastapi import WebSocket
+
+from app.utils.prepare_questions import Question
+
+Frame = Union[str, bytes]
+
+# {"type": "game", "message": "question", "extra": {index, timeout, <Question.frame>}}
+QUESTION_FRAME_HEAD = (
+    '{"type":"game","message":"question","extra":{"index":%d,"question_timeout":%d,'
+)
+
+# ---------------------------------------------------------------- msgpack codes
+# every msgpack frame is an array, [code, *fields]
+QUEUE_START = 1
+FOUND = 2
+START = 3
+QUESTION = 4
+REVEAL = 5
+END = 6
+PING = 7
+PONG = 8
+CHAT = 9
+ERROR = 10
+ANSWER = 11
+QUIT = 12
+
+# (type, message) -> code and the fields of the payload's "extra", in frame order.
+# payloads without a message subtype are looked up as (type, None)
+SERVER_MESSAGES: Dict[Tuple[str, Optional[str]], Tuple[int, Tuple[str, ...]]] = {
+    ("queue", "start"): (QUEUE_START, ()),
+    ("game", "found"): (FOUND, ("session_id",)),
+    ("game", "start"): (START, ("players", "lifes")),
+    ("game", "reveal"): (REVEAL, ("correct", "answers", "lifes")),
+    ("game", "end"): (END, ("winner", "reason", "elo_delta", "questions")),
+    ("ping", None): (PING, ()),
+    ("pong", None): (PONG, ("id",)),
+    ("chat", None): (CHAT, ("from", "text")),
+    ("error", None): (ERROR, ("message",)),
+}
+
+# code -> type and the fields following the code, as handled by the session
+CLIENT_MESSAGES: Dict[int, Tuple[str, Tuple[str, ...]]] = {
+    ANSWER: ("answer", ("choice",)),
+    QUIT: ("quit", ()),
+    PING: ("ping", ("id",)),
+    PONG: ("pong", ()),
+    CHAT: ("chat", ("text",)),
+}
+
+
+class JsonCodec:
+    """The default wire format: text frames holding json objects."""
+
+    name = "json"
+
+    def __init__(self):
+        self.ping = self.encode({"type": "ping"})
+
+    def encode(self, payload: Dict) -> str:
+        return orjson.dumps(payload).decode()
+
+    def encode_question(self, index: int, timeout: int, q: Question) -> str:
+        # question text and choices were encoded when the bank was built,
+        # only the per-session index is spliced in
+        return QUESTION_FRAME_HEAD % (index, timeout) + q.frame + "}}"
+
+    async def receive(self, ws: WebSocket) -> Dict:
+        return await ws.receive_json()
+
+
+class MsgpackCodec:
+    """
+    Compact binary wire format: msgpack arrays led by an integer message code
+    in place of the "type" and "message" keys. The "end" frame references
+    questions by index only, their text was already sent with each question.
+    """
+
+    name = "msgpack"
+
+    def __init__(self):
+        self.ping = self.encode({"type": "ping"})
+
+    def encode(self, payload: Dict) -> bytes:
+        kind = payload.get("type")
+        spec = SERVER_MESSAGES.get((kind, payload.get("message"))) or (
+            SERVER_MESSAGES.get((kind, None))
+        )
+        if spec is None:
+            # not part of the protocol yet, send it as a plain map
+            return msgpack.packb(payload)
+        code, fields = spec
+        source = payload.get("extra", payload)
+        values = [source.get(f) for f in fields]
+        if code == END:
+            values[3] = [[q["index"], q["player_correct"]] for q in values[3]]
+        return msgpack.packb([code, *values])
+
+    def encode_question(self, index: int, timeout: int, q: Question) -> bytes:
+        return msgpack.packb([QUESTION, index, timeout, q.question, q.choices])
+
+    def decode(self, data: bytes) -> Dict:
+        """A client frame, in the same shape as its json counterpart."""
+        msg = msgpack.unpackb(data)
+        if not isinstance(msg, list) or not msg:
+            return {"type": None}
+        spec = CLIENT_MESSAGES.get(msg[0])
+        if spec is None:
+            return {"type": msg[0]}
+        kind, fields = spec
+        return {"type": kind, **dict(zip(fields, msg[1:]))}
+
+    async def receive(self, ws: WebSocket) -> Dict:
+        return self.decode(await ws.receive_bytes())
+
+
+Codec = Union[JsonCodec, MsgpackCodec]
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+CODECS: Dict[str, Codec] = {JSON.name: JSON, MSGPACK.name: MSGPACK}
+
+# websocket subprotocol -> codec, in the server's order of preference
+SUBPROTOCOLS: Dict[str, Codec] = {
+    "trividuel.msgpack.v1": MSGPACK,
+    "trividuel.json.v1": JSON,
+}
+
+
+def negotiate(offered: List[str]) -> Tuple[Optional[str], Codec]:
+    """Pick the subprotocol to accept and its codec, json when nothing offered matches."""
+    for subprotocol, codec in SUBPROTOCOLS.items():
+        if subprotocol in offered:
+            return subprotocol, codec
+    return None, JSON
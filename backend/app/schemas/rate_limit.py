@@ -0,0 +1,73 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from app.utils.metrics import Counter
+
+# limits key covering every message type without a limit of its own
+OTHER = "*"
+
+_dropped: Dict[str, Counter] = {}
+
+
+def dropped_counter(kind: str) -> Counter:
+    """The drop counter of one message type, registered on first use."""
+    counter = _dropped.get(kind)
+    if counter is None:
+        counter = _dropped[kind] = Counter(
+            "trividuel_inbound_dropped_total",
+            "Client messages dropped by the rate limiter",
+            type="other" if kind == OTHER else kind,
+        )
+    return counter
+
+
+class TokenBucket:
+    """Refills `rate` tokens a second up to `burst`, every message takes one."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class InboundLimiter:
+    """
+    Token bucket limits on one connection's inbound messages, one bucket per
+    message type, so spamming chat never gets an answer or a quit dropped.
+    Types not in `limits` share the `OTHER` bucket, and go unlimited when
+    there is no `OTHER` entry. Buckets are created on first use, a player
+    who only answers carries a single one.
+    """
+
+    __slots__ = ("limits", "buckets", "dropped")
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.dropped = 0
+
+    def allow(self, kind, now: Optional[float] = None) -> bool:
+        """Take a token for a message of type `kind`, False if it must be dropped."""
+        key = kind if isinstance(kind, str) and kind in self.limits else OTHER
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            limit = self.limits.get(key)
+            if limit is None:
+                return True
+            bucket = self.buckets[key] = TokenBucket(*limit)
+        if bucket.take(time.monotonic() if now is None else now):
+            return True
+        self.dropped += 1
+        dropped_counter(key).inc()
+        return False
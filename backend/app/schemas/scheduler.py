@@ -0,0 +1,93 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from app.utils.log import get_logger
+
+log = get_logger("scheduler")
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class _Timer:
+    __slots__ = ("key", "callback", "slot", "rounds")
+
+    def __init__(self, key: str, callback: Callback, slot: int, rounds: int):
+        self.key = key
+        self.callback = callback
+        self.slot = slot
+        self.rounds = rounds
+
+
+class SessionScheduler:
+    """
+    Hashed timing wheel driving the phase transitions of every session.
+
+    Each key (a session id) holds at most one pending deadline: scheduling
+    again replaces it, `cancel` drops it, both in O(1). A single loop
+    advances the wheel one slot per tick and runs the due callbacks inline,
+    instead of every session keeping its own sleeping tasks around. Deadlines
+    further out than one turn of the wheel wait out extra rounds in their slot.
+    """
+
+    def __init__(self, tick: float = 0.05, slots: int = 512):
+        self.tick = tick
+        self._wheel: List[Dict[str, _Timer]] = [{} for _ in range(slots)]
+        self._timers: Dict[str, _Timer] = {}
+        self._cursor = 0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: str, delay: float, callback: Callback):
+        """Run `callback` after `delay` seconds, replacing `key`'s pending deadline."""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % len(self._wheel)
+        timer = _Timer(key, callback, slot, (ticks - 1) // len(self._wheel))
+        self._wheel[slot][key] = timer
+        self._timers[key] = timer
+        self._wakeup.set()
+
+    def cancel(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer:
+            del self._wheel[timer.slot][key]
+
+    async def run(self):
+        started, ticks = time.monotonic(), 0
+        while True:
+            if not self._timers:
+                # idle - no ticking until something is scheduled
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                started, ticks = time.monotonic(), 0
+
+            # sleep to the next tick boundary, catching up if the loop fell behind
+            ticks += 1
+            await asyncio.sleep(
+                max(0.0, started + ticks * self.tick - time.monotonic())
+            )
+            self._cursor = (self._cursor + 1) % len(self._wheel)
+
+            for timer in self._expire(self._wheel[self._cursor]):
+                try:
+                    await timer.callback()
+                except Exception:
+                    log.exception("scheduled_callback_failed", session_id=timer.key)
+
+    def _expire(self, bucket: Dict[str, _Timer]) -> List[_Timer]:
+        due = []
+        for key, timer in list(bucket.items()):
+            if timer.rounds:
+                timer.rounds -= 1
+                continue
+            del bucket[key]
+            del self._timers[key]
+            due.append(timer)
+        return due
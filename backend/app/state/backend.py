@@ -0,0 +1,76 @@
+from typing import Dict, List, Set, Tuple
+
+from app.schemas.gamesession import SessionManager
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player, PlayerManager
+
+
+class StateBackend:
+    """
+    Where the state shared by every /play connection lives: who is online,
+    the matchmaking queue, and which session a player's frames belong to.
+
+    This in-process backend keeps all of it in the worker's own managers,
+    which is all a single worker needs. `SharedStateBackend` moves presence
+    and the queue onto a hub so several workers can serve one player base.
+    """
+
+    def __init__(
+        self,
+        players: PlayerManager,
+        queue: MatchmakingQueue,
+        sessions: SessionManager,
+        coalesce: float = 0.0,
+    ):
+        self.players = players
+        self.queue = queue
+        self.sessions = sessions
+        self.coalesce = coalesce
+        # uids connected, or past auth and connecting, to this server
+        self._online: Set[str] = set()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # --------------------------------------------------------------- presence
+    async def claim(self, uid: str) -> bool:
+        """Mark `uid` online, False if it is already connected somewhere."""
+        if uid in self._online:
+            return False
+        self._online.add(uid)
+        return True
+
+    async def release(self, uid: str):
+        self._online.discard(uid)
+
+    async def online_count(self) -> int:
+        return len(self._online)
+
+    # ------------------------------------------------------------ matchmaking
+    async def enqueue(self, player: Player):
+        await self.queue.add(player)
+
+    async def dequeue(self, player: Player):
+        await self.queue.remove(player)
+
+    async def next_pairs(self) -> List[Tuple[Player, Player]]:
+        """Block until there are games for this worker to host, then return them all."""
+        await self.queue.wait_for_pair(self.coalesce)
+        return await self.queue.pop_pairs()
+
+    # --------------------------------------------------------------- sessions
+    async def route(self, uid: str, data: Dict):
+        """Deliver a client message to the session the player is in, if any."""
+        session = self.sessions.get_by_player(uid)
+        if session:
+            await session.handle_client_message(uid, data)
+
+    async def leave(self, uid: str):
+        """The player is gone, settle the session they were in."""
+        session = self.sessions.get_by_player(uid)
+        if session:
+            await session.handle_disconnect(uid)
+            self.sessions.remove(session.id)
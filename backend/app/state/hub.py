@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import os
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player
+from app.utils.log import configure_logging, get_logger
+
+log = get_logger("hub")
+
+# one message per line, "end" frames carry the whole question history
+MAX_MESSAGE = 1 << 20
+
+
+def write_message(writer: asyncio.StreamWriter, msg: Dict):
+    writer.write(orjson.dumps(msg) + b"\n")
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Tuple[Dict, bytes]]:
+    """Next message and its raw line, None once the peer is gone."""
+    line = await reader.readline()
+    if not line:
+        return None
+    return orjson.loads(line), line
+
+
+class StateHub:
+    """
+    State shared by several workers on one host: who is online on which
+    worker, the global matchmaking queue, and which worker hosts the session
+    of a player connected to another one.
+
+    Workers connect over a unix socket and exchange newline delimited json.
+    The hub pairs players across workers and relays the game frames of
+    cross-worker sessions, the sessions themselves run on the worker of
+    the first player of each pair.
+    """
+
+    def __init__(self, coalesce: float = 0.0):
+        self.coalesce = coalesce
+        self.queue = MatchmakingQueue()
+        self._worker_ids = itertools.count()
+        self.workers: Dict[int, asyncio.StreamWriter] = {}
+        # uid -> worker holding the player's socket
+        self.online: Dict[str, int] = {}
+        # queued uid -> (queue stand-in, description sent by the worker)
+        self.queued: Dict[str, Tuple[Player, Dict]] = {}
+        # uid -> worker hosting the session, for players connected elsewhere
+        self.routes: Dict[str, int] = {}
+
+    async def serve(self, socket_path: str):
+        # a socket file left behind by a previous hub would block the bind
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(
+            self._handle_worker, socket_path, limit=MAX_MESSAGE
+        )
+        log.info("state_hub_listening", socket_path=socket_path)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.pair_loop())
+
+    async def _handle_worker(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        worker = next(self._worker_ids)
+        self.workers[worker] = writer
+        try:
+            while (message := await read_message(reader)) is not None:
+                await self._dispatch(worker, *message)
+        except (ConnectionError, ValueError) as e:
+            log.warning("state_hub_worker_failed", worker=worker, error=str(e))
+        finally:
+            await self._drop_worker(worker)
+            writer.close()
+
+    def _send(self, worker: Optional[int], msg: Dict):
+        writer = self.workers.get(worker) if worker is not None else None
+        if writer:
+            write_message(writer, msg)
+
+    def _relay(self, worker: Optional[int], line: bytes):
+        writer = self.workers.get(worker) if worker is not None else None
+        if writer:
+            writer.write(line)
+
+    async def _dispatch(self, worker: int, msg: Dict, line: bytes):
+        op = msg["op"]
+        # only player ops carry a uid
+        uid: str = msg.get("uid", "")
+
+        if op == "send":
+            # game frame for a player, to the worker holding their socket
+            self._relay(self.online.get(uid), line)
+        elif op == "inbound":
+            # client message, to the worker hosting their session
+            self._relay(self.routes.get(uid), line)
+        elif op == "left":
+            # disconnect, to the worker hosting their session, only told once
+            self._relay(self.routes.pop(uid, None), line)
+        elif op == "claim":
+            ok = uid not in self.online
+            if ok:
+                self.online[uid] = worker
+            self._send(worker, {"op": "reply", "rid": msg["rid"], "ok": ok})
+        elif op == "release":
+            if self.online.get(uid) == worker:
+                del self.online[uid]
+                await self._dequeue(uid)
+                owner = self.routes.pop(uid, None)
+                if owner is not None:
+                    # paired just before leaving, before their worker got the
+                    # attach, settle it as a disconnect like _drop_worker does
+                    self._send(owner, {"op": "left", "uid": uid})
+        elif op == "count":
+            self._send(worker, {"op": "reply", "rid": msg["rid"], "count": len(self)})
+        elif op in ("enqueue", "requeue"):
+            info = msg["player"]
+            if op == "requeue":
+                self._detach(info["uid"])
+            if info["uid"] in self.online:
+                await self._enqueue(info)
+        elif op == "dequeue":
+            await self._dequeue(uid)
+        elif op == "ended":
+            self._detach(uid)
+        elif op == "publish":
+            for other in list(self.workers):
+                if other != worker:
+                    self._relay(other, line)
+
+    def __len__(self) -> int:
+        return len(self.online)
+
+    async def _enqueue(self, info: Dict):
+        stand_in = Player(
+            uid=info["uid"],
+            ws=None,
+            type=info["type"],
+            total_won=info["total_won"],
+            elo=info["elo"],
+            name=info["name"],
+            country=info["country"],
+        )
+        self.queued[info["uid"]] = (stand_in, info)
+        await self.queue.add(stand_in)
+
+    async def _dequeue(self, uid: str):
+        entry = self.queued.pop(uid, None)
+        if entry:
+            await self.queue.remove(entry[0])
+
+    def _detach(self, uid: str):
+        """The player's cross-worker session is over, stop relaying for it."""
+        if self.routes.pop(uid, None) is not None:
+            self._send(self.online.get(uid), {"op": "detach", "uid": uid})
+
+    async def pair_loop(self):
+        while True:
+            await self.queue.wait_for_pair(self.coalesce)
+            for p1, p2 in await self.queue.pop_pairs():
+                infos = [self.queued.pop(p.uid)[1] for p in (p1, p2)]
+                owner, other = self.online[p1.uid], self.online[p2.uid]
+                remote = owner != other
+                if remote:
+                    # attach goes out first, so the player's worker knows where
+                    # to forward answers before the first frame reaches them
+                    self.routes[p2.uid] = owner
+                    self._send(other, {"op": "attach", "uid": p2.uid})
+                self._send(
+                    owner, {"op": "match", "players": infos, "remote": [False, remote]}
+                )
+
+    async def _drop_worker(self, worker: int):
+        del self.workers[worker]
+        for uid, w in list(self.online.items()):
+            if w == worker:
+                del self.online[uid]
+                await self._dequeue(uid)
+        for uid, owner in list(self.routes.items()):
+            if owner == worker:
+                # the session died with its worker, close the player so they can rejoin
+                del self.routes[uid]
+                self._send(
+                    self.online.get(uid), {"op": "detach", "uid": uid, "abort": True}
+                )
+            elif uid not in self.online:
+                # the player's worker died mid game, settle it as a disconnect
+                del self.routes[uid]
+                self._send(owner, {"op": "left", "uid": uid})
+
+
+if __name__ == "__main__":
+    # python -m app.state.hub, run next to `uvicorn --workers N` with STATE_BACKEND=shared
+    configure_logging(settings.LOG_LEVEL, settings.LOG_SAMPLE_RATES)
+    hub = StateHub(settings.QUEUEING_COALESCE_WINDOW)
+    asyncio.run(hub.serve(settings.STATE_SOCKET_PATH))
@@ -0,0 +1,259 @@
+import asyncio
+import base64
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.schemas.gamesession import GameSession, SessionManager, apply_result
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player, PlayerManager
+from app.schemas.protocol import CODECS, Codec, Frame
+from app.state.backend import StateBackend
+from app.state.hub import MAX_MESSAGE, read_message, write_message
+from app.utils.log import get_logger
+
+log = get_logger("state")
+
+
+class RemoteConnection:
+    """
+    Stands in for the socket of a player connected to another worker.
+    Frames are encoded in the player's negotiated protocol and relayed
+    through the hub to the worker holding the socket.
+    """
+
+    def __init__(self, backend: "SharedStateBackend", uid: str, codec: Codec):
+        self.backend = backend
+        self.uid = uid
+        self.codec = codec
+
+    def send(self, frame: Frame) -> bool:
+        return self.backend.forward_frame(self.uid, frame)
+
+    def send_json(self, payload: Dict) -> bool:
+        return self.send(self.codec.encode(payload))
+
+    async def close(self, code: int = 1000):
+        # the socket belongs to the other worker, it closes it
+        pass
+
+
+def describe(player: Player) -> Dict:
+    return player.to_dict() | {"uid": player.uid, "protocol": player.conn.codec.name}
+
+
+class SharedStateBackend(StateBackend):
+    """
+    State backend for several workers on one host, kept on a `StateHub`
+    reached over a unix socket.
+
+    Presence and the queue live on the hub, so a uid can only be online once
+    and players on different workers are matched together. A session runs
+    on the worker of its first player: the opponent is a `Player` whose
+    connection relays frames through the hub, and their worker forwards the
+    opponent's messages and disconnect back to the session.
+    """
+
+    def __init__(
+        self,
+        players: PlayerManager,
+        queue: MatchmakingQueue,
+        sessions: SessionManager,
+        socket_path: str,
+        coalesce: float = 0.0,
+    ):
+        super().__init__(players, queue, sessions, coalesce)
+        self.socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._rids = itertools.count()
+        self._replies: Dict[int, asyncio.Future] = {}
+        # games paired by the hub, waiting for the matchmaker loop to start them
+        self._pairs: List[Tuple[Player, Player]] = []
+        self._paired = asyncio.Event()
+        # local players whose session is hosted by another worker
+        self._attached: Set[str] = set()
+
+        sessions.on_remove = self._session_removed
+        sessions.on_result = self._publish_result
+
+    async def start(self, attempts: int = 50):
+        for attempt in range(attempts):
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self.socket_path, limit=MAX_MESSAGE
+                )
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # the hub may still be starting up next to the workers
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(0.1)
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    def _send(self, msg: Dict) -> bool:
+        if self._writer is None or self._writer.is_closing():
+            return False
+        write_message(self._writer, msg)
+        return True
+
+    async def _call(self, msg: Dict) -> Dict:
+        rid = next(self._rids)
+        reply = asyncio.get_running_loop().create_future()
+        self._replies[rid] = reply
+        try:
+            if not self._send(msg | {"rid": rid}):
+                raise ConnectionError("state hub connection closed")
+            return await reply
+        finally:
+            self._replies.pop(rid, None)
+
+    # --------------------------------------------------------------- presence
+    async def claim(self, uid: str) -> bool:
+        return (await self._call({"op": "claim", "uid": uid}))["ok"]
+
+    async def release(self, uid: str):
+        self._send({"op": "release", "uid": uid})
+
+    async def online_count(self) -> int:
+        return (await self._call({"op": "count"}))["count"]
+
+    # ------------------------------------------------------------ matchmaking
+    async def enqueue(self, player: Player):
+        self._send({"op": "enqueue", "player": describe(player)})
+
+    async def dequeue(self, player: Player):
+        self._send({"op": "dequeue", "uid": player.uid})
+
+    async def next_pairs(self) -> List[Tuple[Player, Player]]:
+        while not self._pairs:
+            self._paired.clear()
+            await self._paired.wait()
+        pairs, self._pairs = self._pairs, []
+        return pairs
+
+    def _on_match(self, infos: List[Dict], remote: List[bool]):
+        host, opponent = [
+            self._remote_player(info) if is_remote else self.players.get(info["uid"])
+            for info, is_remote in zip(infos, remote)
+        ]
+        if host is None or opponent is None:
+            # someone left while the hub paired them, the other goes back in the queue
+            for info, player in zip(infos, (host, opponent)):
+                if player is not None:
+                    self._send({"op": "requeue", "player": info})
+            return
+        self._pairs.append((host, opponent))
+        self._paired.set()
+
+    def _unpair(self, uid: str) -> bool:
+        """Drop the game `uid` was paired into if it has not started, True if there was one."""
+        for pair in self._pairs:
+            if any(p.uid == uid for p in pair):
+                self._pairs.remove(pair)
+                # the opponent never heard of the game, back in the queue they go
+                for p in pair:
+                    if p.uid != uid:
+                        self._send({"op": "requeue", "player": describe(p)})
+                return True
+        return False
+
+    def _remote_player(self, info: Dict) -> Player:
+        player = Player(
+            uid=info["uid"],
+            ws=None,
+            type=info["type"],
+            total_won=info["total_won"],
+            elo=info["elo"],
+            name=info["name"],
+            country=info["country"],
+        )
+        player.conn = RemoteConnection(self, player.uid, CODECS[info["protocol"]])
+        return player
+
+    # --------------------------------------------------------------- sessions
+    async def route(self, uid: str, data: Dict):
+        if uid in self._attached:
+            self._send({"op": "inbound", "uid": uid, "data": data})
+        else:
+            await super().route(uid, data)
+
+    async def leave(self, uid: str):
+        if uid in self._attached:
+            self._attached.discard(uid)
+            self._send({"op": "left", "uid": uid})
+        elif not self._unpair(uid):
+            await super().leave(uid)
+
+    def forward_frame(self, uid: str, frame: Frame) -> bool:
+        if isinstance(frame, bytes):
+            # hub messages are json lines
+            encoded = base64.b64encode(frame).decode()
+            return self._send({"op": "send", "uid": uid, "bin": encoded})
+        return self._send({"op": "send", "uid": uid, "frame": frame})
+
+    def _session_removed(self, session: GameSession):
+        for p in session.players:
+            if isinstance(p.conn, RemoteConnection):
+                self._send({"op": "ended", "uid": p.uid})
+
+    def _publish_result(self, uid: str, fields: Dict):
+        # other workers may be holding this player's profile in their caches
+        self._send({"op": "publish", "uid": uid, "fields": fields})
+
+    # ------------------------------------------------------------- hub events
+    async def _read_loop(self):
+        try:
+            while (message := await read_message(self._reader)) is not None:
+                try:
+                    await self._dispatch(message[0])
+                except Exception:
+                    log.exception("state_hub_message_failed", op=message[0].get("op"))
+        finally:
+            log.error("state_hub_connection_lost")
+            self._writer.close()
+            for reply in self._replies.values():
+                if not reply.done():
+                    reply.set_exception(ConnectionError("state hub connection lost"))
+
+    async def _dispatch(self, msg: Dict):
+        op = msg["op"]
+        # only player ops carry a uid
+        uid: str = msg.get("uid", "")
+
+        if op == "send":
+            player = self.players.get(uid)
+            if player:
+                frame = msg.get("frame")
+                player.conn.send(
+                    frame if frame is not None else base64.b64decode(msg["bin"])
+                )
+        elif op == "inbound":
+            await super().route(uid, msg["data"])
+        elif op == "left":
+            # the hub relays a leave as soon as it pairs, maybe before the game started
+            if not self._unpair(uid):
+                await super().leave(uid)
+        elif op == "reply":
+            reply = self._replies.get(msg["rid"])
+            if reply and not reply.done():
+                reply.set_result(msg)
+        elif op == "match":
+            self._on_match(msg["players"], msg["remote"])
+        elif op == "attach":
+            # a player who left meanwhile was settled by the release
+            if self.players.get(uid):
+                self._attached.add(uid)
+        elif op == "detach":
+            self._attached.discard(uid)
+            player = self.players.get(uid)
+            if msg.get("abort") and player:
+                await player.conn.close()
+        elif op == "publish":
+            apply_result(uid, msg["fields"])
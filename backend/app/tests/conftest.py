@@ -0,0 +1,4 @@
+import os
+
+# tests never talk to the real database
+os.environ.setdefault("FIRESTORE_BACKEND", "fake")
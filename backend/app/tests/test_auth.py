@@ -0,0 +1,103 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.dependencies import auth
+
+
+class CountingVerifier:
+    """Stand-in for firebase's verify_id_token"""
+
+    def __init__(self, exp_in: float = 3600):
+        self.calls = 0
+        self.exp_in = exp_in
+
+    def __call__(self, token):
+        self.calls += 1
+        if token == "bad":
+            raise ValueError("invalid token")
+        return {
+            "uid": f"uid-{token}",
+            "name": "Tester",
+            "exp": time.time() + self.exp_in,
+        }
+
+
+@pytest.fixture
+def verifier(monkeypatch):
+    v = CountingVerifier()
+    monkeypatch.setattr(auth.auth, "verify_id_token", v)
+    auth._token_cache.clear()
+    return v
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_verified_token_cached(verifier):
+    """the same token is only verified once while it is valid"""
+    first = await auth.get_current_user("tok")
+    second = await auth.get_current_user("tok")
+
+    assert first == second == {"uid": "uid-tok", "name": "Tester"}
+    assert verifier.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_token_reverified(verifier):
+    """cached tokens are dropped once they expire"""
+    verifier.exp_in = -1
+
+    await auth.get_current_user("tok")
+    await auth.get_current_user("tok")
+
+    assert verifier.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_rejected(verifier):
+    """invalid tokens raise a 401 and are never cached"""
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await auth.get_current_user("bad")
+        assert exc.value.status_code == 401
+
+    assert verifier.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_bounded(verifier, monkeypatch):
+    """the least recently used token is evicted past the bound"""
+    monkeypatch.setattr(auth.settings, "AUTH_TOKEN_CACHE_SIZE", 2)
+
+    for token in ["a", "b", "c"]:
+        await auth.get_current_user(token)
+
+    assert list(auth._token_cache) == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_synthetic_tokens_in_test_mode(verifier, monkeypatch):
+    """any test-* token is its own uid in TEST mode, never in PROD"""
+    monkeypatch.setattr(auth.settings, "environment", "TEST")
+    user = await auth.get_current_user("test-load-42")
+    assert user == {"uid": "test-load-42", "name": "test-load-42"}
+    assert verifier.calls == 0
+
+    monkeypatch.setattr(auth.settings, "environment", "PROD")
+    user = await auth.get_current_user("test-load-42")
+    assert user["uid"] == "uid-test-load-42"
+    assert verifier.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_admin_only_listed_uids(verifier, monkeypatch):
+    """admin endpoints refuse valid users missing from ADMIN_UIDS"""
+    monkeypatch.setattr(auth.settings, "ADMIN_UIDS", ["uid-boss"])
+
+    assert (await auth.get_admin_user("boss"))["uid"] == "uid-boss"
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_admin_user("player")
+    assert exc.value.status_code == 403
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.schemas.connection import SLOW_CONSUMER_CLOSE_CODE, Connection
+from app.schemas.protocol import MSGPACK
+
+
+class DummyWebSocket:
+    def __init__(self, delay: float = 0):
+        self.sent = []
+        self.delay = delay
+        self.close_code = None
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_frames_written_in_order():
+    """the writer task delivers queued frames in order"""
+    ws = DummyWebSocket()
+    conn = Connection(ws)
+
+    for i in range(5):
+        assert conn.send(str(i))
+    await asyncio.sleep(0.01)
+
+    assert ws.sent == ["0", "1", "2", "3", "4"]
+    await conn.close()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_binary_frames_sent_as_bytes():
+    """a msgpack connection encodes with its codec and writes binary frames"""
+    ws = DummyWebSocket()
+    conn = Connection(ws, codec=MSGPACK)
+
+    conn.send_json({"type": "ping"})
+    conn.send("notice")
+    await asyncio.sleep(0.01)
+
+    assert ws.sent == [MSGPACK.ping, "notice"]
+    assert isinstance(ws.sent[0], bytes)
+    await conn.close()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_block_others():
+    """a slow socket doesn't hold up frames for a fast one"""
+    slow, fast = DummyWebSocket(delay=1), DummyWebSocket()
+    conns = [Connection(slow), Connection(fast)]
+
+    for c in conns:
+        c.send("question")
+    await asyncio.sleep(0.01)
+
+    assert fast.sent == ["question"]
+    assert slow.sent == []
+    for c in conns:
+        await c.close()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_overflow_drops_connection():
+    """a consumer that overflows its queue is closed and refuses new frames"""
+    ws = DummyWebSocket(delay=1)
+    conn = Connection(ws, max_pending=2)
+
+    results = [conn.send(str(i)) for i in range(4)]
+    await asyncio.sleep(0.01)
+
+    assert results[-1] is False
+    assert conn.overflowed
+    assert ws.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert conn.send("late") is False
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+
+from app.utils.fake_firestore import FakeFirestore
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_document_roundtrip():
+    """set / get / update behave like the real client"""
+    db = FakeFirestore()
+    doc = db.collection("players").document("a")
+
+    assert not (await doc.get()).exists
+    with pytest.raises(NotFound):
+        await doc.update({"elo": 1300})
+
+    await doc.set({"elo": 1200, "type": "elf"})
+    await doc.update({"elo": 1300})
+    await doc.set({"total_won": 1}, merge=True)
+
+    snapshot = await doc.get()
+    assert snapshot.id == "a"
+    assert snapshot.to_dict() == {"elo": 1300, "type": "elf", "total_won": 1}
+
+
+@pytest.mark.asyncio
+async def test_batch_is_all_or_nothing():
+    """a failed commit applies none of its writes"""
+    db = FakeFirestore(failure_rate=1.0)
+    players = db.collection("players")
+    batch = db.batch()
+    batch.set(players.document("a"), {"elo": 1210}, merge=True)
+    batch.set(players.document("b"), {"elo": 1190}, merge=True)
+
+    with pytest.raises(ServiceUnavailable):
+        await batch.commit()
+    assert db._collections == {}
+
+    db.failure_rate = 0
+    await batch.commit()
+    assert [d.id async for d in players.stream()] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_latency_per_round_trip():
+    """every call waits out the configured latency"""
+    db = FakeFirestore(latency=0.02)
+    doc = db.collection("players").document("a")
+
+    start = time.monotonic()
+    await doc.set({"elo": 1200})
+    await doc.get()
+
+    assert time.monotonic() - start >= 0.04
+    assert db.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_seeded_players():
+    """seeded players stream back one page per round trip"""
+    db = FakeFirestore(seed=1)
+    db.seed_players(FakeFirestore.STREAM_PAGE_SIZE + 1, ["elf", "witch"])
+
+    docs = [d async for d in db.collection("players").stream()]
+
+    assert len(docs) == FakeFirestore.STREAM_PAGE_SIZE + 1
+    assert docs[0].to_dict()["uid"] == docs[0].id
+    assert db.calls == 2
@@ -0,0 +1,177 @@
+import json
+
+import msgpack
+import pytest
+
+from app.db import db, result_writer
+from app.schemas import leaderboard, scheduler
+from app.schemas.gamesession import GameSession, SessionManager
+from app.schemas.players import Player
+from app.schemas.protocol import END, JSON, MSGPACK, QUESTION
+from app.utils import prepare_questions
+
+
+class RecordingConnection:
+    """Collects the frames a session sends to one player"""
+
+    def __init__(self, codec=JSON):
+        self.codec = codec
+        self.frames = []
+
+    def send(self, frame) -> bool:
+        if isinstance(frame, bytes):
+            self.frames.append(msgpack.unpackb(frame))
+        else:
+            self.frames.append(json.loads(frame))
+        return True
+
+    def send_json(self, payload) -> bool:
+        return self.send(self.codec.encode(payload))
+
+    async def close(self, code=1000):
+        pass
+
+    def messages(self):
+        return [f.get("message") for f in self.frames]
+
+
+def make_player(uid: str, elo: int = 1200) -> Player:
+    player = Player(uid, None, "elf", total_won=0, elo=elo, name=uid, country="SG")
+    player.conn = RecordingConnection()
+    return player
+
+
+@pytest.fixture
+def session(monkeypatch):
+    bank = prepare_questions.QuestionBank(
+        prepare_questions.compile_columns(
+            [f"q{i}" for i in range(GameSession.QUESTION_COUNT)],
+            [["a", "b", "c", "d"]] * GameSession.QUESTION_COUNT,
+            [1] * GameSession.QUESTION_COUNT,
+            ["science"] * GameSession.QUESTION_COUNT,
+        )
+    )
+    monkeypatch.setattr(prepare_questions, "QUESTION_BANK", bank)
+    manager = SessionManager()
+    s = GameSession(make_player("p1"), make_player("p2"))
+    manager.add(s)
+    yield s
+    scheduler.cancel(s.id)
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_both_answers_reveal_early(session):
+    """the reveal goes out as soon as both players answered"""
+    await session.start()
+    await session.next_question()
+    assert session.id in scheduler
+
+    await session.receive_answer("p1", 1)
+    await session.receive_answer("p2", 0)
+
+    reveal = session.players[0].conn.frames[-1]
+    assert reveal["message"] == "reveal"
+    assert reveal["extra"]["answers"] == {"p1": 1, "p2": 0}
+    assert reveal["extra"]["lifes"]["p2"][1] == GameSession.PLAYER_STARTING_LIFE - 1
+
+
+@pytest.mark.asyncio
+async def test_disconnect_records_result(session):
+    """leaving mid game hands the win to the opponent and stores both ratings"""
+    await session.start()
+    await session.next_question()
+
+    await session.handle_disconnect("p2")
+
+    end = session.players[0].conn.frames[-1]
+    assert end["message"] == "end"
+    assert end["extra"]["winner"] == "p1"
+    assert session.id not in scheduler
+    assert session.manager.get_by_player("p1") is None
+
+    assert leaderboard.global_rank("p1") is not None
+
+    await result_writer.flush()
+    stored = (await db.collection("players").document("p1").get()).to_dict()
+    assert stored["elo"] > 1200
+    assert stored["total_won"] == 1
+
+
+@pytest.mark.asyncio
+async def test_late_answers_ignored(session):
+    """answers outside an open question neither count nor re-reveal"""
+    await session.start()
+    await session.receive_answer("p1", 1)
+    assert session.answers == [None, None]
+
+    await session.next_question()
+    await session.receive_answer("p1", 1)
+    await session.receive_answer("p2", 1)
+    frames = len(session.players[0].conn.frames)
+
+    await session.receive_answer("p2", 0)
+    await session.receive_answer("stranger", 0)
+
+    assert len(session.players[0].conn.frames) == frames
+    assert session.lifes == [GameSession.PLAYER_STARTING_LIFE] * 2
+
+
+def test_players_carry_no_game_state(session):
+    """game state lives on the session, players are slotted"""
+    assert session.seats == {"p1": 0, "p2": 1}
+    with pytest.raises(AttributeError):
+        session.players[0].lifes = 3
+
+
+@pytest.mark.asyncio
+async def test_players_get_their_own_protocol(session):
+    """each player's frames are encoded in the protocol they negotiated"""
+    session.players[1].conn = RecordingConnection(MSGPACK)
+    await session.start()
+    await session.next_question()
+    await session.receive_answer("p1", 1)
+    await session.receive_answer("p2", 0)
+    await session.handle_disconnect("p2")
+
+    as_json = session.players[0].conn.frames
+    as_msgpack = session.players[1].conn.frames
+    assert as_msgpack[1][:3] == [QUESTION, 0, GameSession.QUESTION_TIMEOUT]
+    assert as_msgpack[1][3:] == [
+        as_json[1]["extra"]["question"],
+        as_json[1]["extra"]["choices"],
+    ]
+
+    # the json history repeats question text, msgpack references it by index
+    assert as_json[-1]["extra"]["questions"][0]["question:"]
+    assert as_msgpack[-1][0] == END
+    assert as_msgpack[-1][4] == [[0, {"p1": True, "p2": False}]]
+
+
+def test_session_manager_indexes_players():
+    """sessions are found by player, removal keeps routes of a newer session"""
+    manager = SessionManager()
+    p1, p2, p3 = make_player("p1"), make_player("p2"), make_player("p3")
+    first = GameSession(p1, p2)
+    manager.add(first)
+
+    assert first.manager is manager
+    assert manager.get_by_player("p1") is first
+    assert manager.get_by_player("p2") is first
+    assert manager.get_by_player("p3") is None
+
+    # p1 is already in a new game when the old one is cleaned up
+    second = GameSession(p1, p3)
+    manager.add(second)
+    manager.remove(first.id)
+
+    assert manager.get_by_player("p1") is second
+    assert manager.get_by_player("p2") is None
+    assert len(manager) == 1
+
+    manager.remove(second.id)
+    manager.remove(second.id)
+    assert manager.get_by_player("p1") is None
+    assert len(manager) == 0
@@ -0,0 +1,124 @@
+from app.schemas.leaderboard import Leaderboard
+
+
+def make_records():
+    """Return raw player docs as they come out of firestore"""
+    return [
+        {"uid": "a", "display_name": "A", "elo": 1500, "country": "sg"},
+        {"uid": "b", "display_name": "B", "elo": "1800", "country": "US"},
+        {"uid": "c", "display_name": "C", "elo": 1200, "country": "SG"},
+        {"uid": "d", "display_name": "D", "elo": None, "country": None},
+    ] + [
+        {"uid": f"x{i}", "display_name": "X", "elo": 1000 - i, "country": "SG"}
+        for i in range(12)
+    ]
+
+
+def make_leaderboard() -> Leaderboard:
+    lb = Leaderboard()
+    lb.reconcile(make_records())
+    return lb
+
+
+# TESTS
+
+
+def test_global_ranks():
+    """players are ranked by elo with dirty fields cleaned up"""
+    lb = make_leaderboard()
+
+    assert len(lb) == 16
+    assert lb.global_rank("b") == 1
+    assert lb.global_rank("a") == 2
+    assert lb.global_rank("d") == 16
+    assert lb.global_rank("nobody") is None
+    assert [r["uid"] for r in lb.top()[:3]] == ["b", "a", "c"]
+    assert len(lb.top()) == 10
+
+
+def test_regional_ranks():
+    """regional rank is only given for players from the requested region"""
+    lb = make_leaderboard()
+
+    assert lb.rank_in_region("a", "SG") == 1
+    assert lb.rank_in_region("c", "SG") == 2
+    assert lb.rank_in_region("a", "US") is None
+    assert lb.rank_in_region("d", "IDK") == 1
+    assert len(lb.top("SG")) == 10
+    assert lb.top("JP") == []
+
+
+def test_update_moves_player():
+    """a match result re-ranks the player and refreshes the top 10"""
+    lb = make_leaderboard()
+    assert lb.top()[0]["uid"] == "b"
+
+    lb.update("c", elo=1900, total_won=1)
+
+    assert lb.global_rank("c") == 1
+    assert lb.rank_in_region("c", "SG") == 1
+    assert lb.rank_in_region("a", "SG") == 2
+    assert lb.top()[0] == {
+        "uid": "c",
+        "display_name": "C",
+        "elo": 1900,
+        "rank": 1,
+        "total_won": 1,
+        "country": "SG",
+    }
+    assert lb.top("SG")[0]["uid"] == "c"
+
+
+def test_update_new_player():
+    """players missing from the last rescan are inserted"""
+    lb = make_leaderboard()
+
+    lb.update("new", elo=1600, display_name="New", country="us")
+
+    assert lb.global_rank("new") == 2
+    assert lb.rank_in_region("new", "US") == 2
+    assert len(lb) == 17
+
+
+def test_reconcile_keeps_live_results():
+    """results recorded while a rescan streams aren't rolled back by it"""
+    lb = make_leaderboard()
+
+    lb.begin_reconcile()
+    lb.update("d", elo=2000)
+    # the rescan started before the result was written, so still has the old elo
+    lb.reconcile(make_records())
+
+    assert lb.global_rank("d") == 1
+
+
+def test_reconcile_keeps_unsaved_results():
+    """results recorded before a rescan but not yet saved aren't rolled back"""
+    lb = make_leaderboard()
+    lb.update("a", elo=1400)
+
+    # "a"'s write is still queued, the rescan reads the old document
+    lb.begin_reconcile(unsaved=["a", "unknown"])
+    lb.reconcile(make_records())
+
+    assert lb._rows["a"]["elo"] == 1400
+    assert "unknown" not in lb._rows
+
+
+def test_build_response():
+    """response has the same shape the frontend expects"""
+    lb = make_leaderboard()
+
+    res = lb.build_response("c", "SG")
+
+    assert res["global_rank"] == 3
+    assert res["regional_rank"] == 2
+    assert res["region"] == "SG"
+    assert res["regional_top10"][0] == {
+        "uid": "a",
+        "display_name": "A",
+        "elo": 1500,
+        "rank": 1,
+        "total_won": 0,
+    }
+    assert res["last_update"] == 0
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.schemas.liveness import LivenessMonitor
+
+
+class Recorder:
+    """Collects the ping / dead callbacks fired by the monitor"""
+
+    def __init__(self, fail_ping: bool = False):
+        self.pings = 0
+        self.dead = 0
+        self.fail_ping = fail_ping
+
+    async def ping(self):
+        self.pings += 1
+        if self.fail_ping:
+            raise RuntimeError("socket closed")
+
+    async def on_dead(self):
+        self.dead += 1
+
+
+async def run_monitor(monitor: LivenessMonitor, seconds: float):
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_silent_connection_is_pinged_then_reaped():
+    """a connection that never answers gets pinged and is then declared dead"""
+    monitor = LivenessMonitor(ping_interval=0.02, timeout=0.06)
+    rec = Recorder()
+    monitor.register("a", rec.ping, rec.on_dead)
+
+    await run_monitor(monitor, 0.12)
+
+    assert rec.pings >= 1
+    assert rec.dead == 1
+    assert len(monitor) == 0
+
+
+@pytest.mark.asyncio
+async def test_active_connection_stays_alive():
+    """inbound frames push the deadline back, so no ping is needed"""
+    monitor = LivenessMonitor(ping_interval=0.05, timeout=0.1)
+    rec = Recorder()
+    monitor.register("a", rec.ping, rec.on_dead)
+
+    task = asyncio.create_task(monitor.run())
+    for _ in range(10):
+        await asyncio.sleep(0.02)
+        monitor.touch("a")
+    task.cancel()
+
+    assert rec.pings == 0
+    assert rec.dead == 0
+    assert len(monitor) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_ping_reaps_immediately():
+    """a socket that can't be written to is dead without waiting for the timeout"""
+    monitor = LivenessMonitor(ping_interval=0.02, timeout=10)
+    rec = Recorder(fail_ping=True)
+    monitor.register("a", rec.ping, rec.on_dead)
+
+    await run_monitor(monitor, 0.06)
+
+    assert rec.pings == 1
+    assert rec.dead == 1
+
+
+@pytest.mark.asyncio
+async def test_unregister_stops_callbacks():
+    """unregistered connections never fire callbacks"""
+    monitor = LivenessMonitor(ping_interval=0.02, timeout=0.04)
+    rec = Recorder()
+    monitor.register("a", rec.ping, rec.on_dead)
+    monitor.unregister("a")
+
+    await run_monitor(monitor, 0.08)
+
+    assert rec.pings == 0
+    assert rec.dead == 0
@@ -0,0 +1,57 @@
+import io
+import json
+
+import pytest
+
+from app.utils import log
+
+
+@pytest.fixture
+def stream():
+    out = io.StringIO()
+    log.configure_logging("INFO", {"sampled_out": 0.0}, stream=out)
+    yield out
+    log.configure_logging("INFO")
+
+
+def records(stream):
+    # stopping the listener flushes everything still queued
+    log.shutdown_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+# TESTS
+
+
+def test_structured_records(stream):
+    """each event is one json line carrying its fields"""
+    log.get_logger("test").info("session_ended", session_id="s1", seconds=12.5)
+
+    [entry] = records(stream)
+    assert entry["event"] == "session_ended"
+    assert entry["level"] == "info"
+    assert entry["logger"] == "trividuel.test"
+    assert entry["session_id"] == "s1"
+    assert entry["seconds"] == 12.5
+
+
+def test_levels_and_sampling(stream):
+    """disabled levels and sampled out events are dropped"""
+    logger = log.get_logger("test")
+    logger.debug("too_chatty")
+    logger.info("sampled_out")
+    logger.warning("kept")
+
+    assert [e["event"] for e in records(stream)] == ["kept"]
+
+
+def test_exception_traceback(stream):
+    """the traceback is formatted on the writer thread"""
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        log.get_logger("test").exception("failed", uid="a")
+
+    [entry] = records(stream)
+    assert entry["level"] == "error"
+    assert "RuntimeError: boom" in entry["exc"]
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.loop_monitor import LoopLagMonitor
+
+
+def blocking_call(seconds: float):
+    time.sleep(seconds)
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_profiled():
+    """a call holding the loop past the threshold shows up in the report"""
+    monitor = LoopLagMonitor(threshold=0.05, interval=0.01, sample_interval=0.005)
+    monitor.start()
+    await asyncio.sleep(0.03)
+
+    blocking_call(0.2)
+    await asyncio.sleep(0.03)
+    monitor.stop()
+
+    report = monitor.report()
+    assert report["stalls"] == 1
+    assert report["max_lag"] >= 0.15
+    top = report["offenders"][0]
+    assert top["stack"][-1].endswith(" blocking_call")
+    assert top["blocked_seconds"] > 0
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_reports_nothing():
+    """short awaits never count as stalls"""
+    monitor = LoopLagMonitor(threshold=0.05, interval=0.01, sample_interval=0.005)
+    monitor.start()
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+    monitor.stop()
+
+    assert monitor.report()["offenders"] == []
+
+    monitor._stacks[("x",)] = 3
+    monitor.reset()
+    assert monitor.report()["offenders"] == []
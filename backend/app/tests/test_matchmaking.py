@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player
+
+
+def make_player(uid: str, elo: int) -> Player:
+    """Return a mock player obj"""
+    return Player(uid, None, "businessman", elo=elo)
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_pop_pair_nearest_elo():
+    """the two closest rated players at the bottom of the queue are paired"""
+    q = MatchmakingQueue()
+    for uid, elo in [("a", 1500), ("b", 1100), ("c", 1200)]:
+        await q.add(make_player(uid, elo))
+
+    p1, p2 = await q.pop_pair()
+
+    assert (p1.uid, p2.uid) == ("b", "c")
+    assert len(q) == 1
+    assert await q.pop_pair() is None
+
+
+@pytest.mark.asyncio
+async def test_remove_player():
+    """removing a queued player drops them from the pairing order"""
+    q = MatchmakingQueue()
+    a, b, c = make_player("a", 1200), make_player("b", 1200), make_player("c", 1300)
+    for p in (a, b, c):
+        await q.add(p)
+
+    await q.remove(b)
+    # removing twice / removing an unknown player is a no-op
+    await q.remove(b)
+    await q.remove(make_player("z", 1000))
+
+    assert b not in q
+    assert await q.pop_pair() == (a, c)
+
+
+@pytest.mark.asyncio
+async def test_readd_replaces_entry():
+    """adding the same uid twice keeps a single queue entry"""
+    q = MatchmakingQueue()
+    await q.add(make_player("a", 1200))
+    await q.add(make_player("a", 1300))
+
+    assert len(q) == 1
+
+
+@pytest.mark.asyncio
+async def test_pop_pairs_drains_queue():
+    """every possible pair is made in one pass, the odd player stays queued"""
+    q = MatchmakingQueue()
+    for i in range(7):
+        await q.add(make_player(str(i), 1000 + i * 10))
+
+    pairs = await q.pop_pairs()
+
+    assert [(p1.uid, p2.uid) for p1, p2 in pairs] == [
+        ("0", "1"),
+        ("2", "3"),
+        ("4", "5"),
+    ]
+    assert len(q) == 1
+    assert await q.pop_pairs() == []
+
+
+@pytest.mark.asyncio
+async def test_wait_for_pair_wakes_on_second_player():
+    """the matcher sleeps with one player queued and wakes once a pair exists"""
+    q = MatchmakingQueue()
+    await q.add(make_player("a", 1200))
+
+    waiter = asyncio.create_task(q.wait_for_pair())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    await q.add(make_player("b", 1200))
+    await asyncio.wait_for(waiter, timeout=0.1)
+
+    # draining the queue puts the matcher back to sleep
+    await q.pop_pairs()
+    waiter = asyncio.create_task(q.wait_for_pair())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    waiter.cancel()
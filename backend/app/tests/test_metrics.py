@@ -0,0 +1,61 @@
+import pytest
+
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player
+from app.utils import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+# TESTS
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    """each bucket counts everything at or below its bound"""
+    h = metrics.Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        h.observe(value)
+
+    assert h.samples() == [
+        't_seconds_bucket{le="0.1"} 2',
+        't_seconds_bucket{le="1.0"} 3',
+        't_seconds_bucket{le="+Inf"} 4',
+        "t_seconds_sum 3.65",
+        "t_seconds_count 4",
+    ]
+
+
+def test_render_groups_labelled_series(registry):
+    """series sharing a name get one HELP / TYPE header"""
+    metrics.Counter("t_total", "test", op="a").inc()
+    metrics.Gauge("t_depth", "depth", lambda: 7)
+    metrics.Counter("t_total", "test", op="b").inc(2)
+
+    assert metrics.render().splitlines() == [
+        "# HELP t_depth depth",
+        "# TYPE t_depth gauge",
+        "t_depth 7",
+        "# HELP t_total test",
+        "# TYPE t_total counter",
+        't_total{op="a"} 1',
+        't_total{op="b"} 2',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_queue_records_time_to_match():
+    """every matched player contributes one time-to-match sample"""
+    before = sum(metrics.QUEUE_WAIT.counts)
+    queue = MatchmakingQueue()
+    await queue.add(Player("a", None, "elf", elo=1200))
+    await queue.add(Player("b", None, "elf", elo=1210))
+    await queue.add(Player("c", None, "elf", elo=1300))
+    await queue.remove(queue._players["c"])
+
+    await queue.pop_pairs()
+
+    assert sum(metrics.QUEUE_WAIT.counts) - before == 2
@@ -0,0 +1,64 @@
+import ipaddress
+
+import pytest
+
+from app.utils.network_cache import NetworkCache
+
+
+def net(s: str):
+    return ipaddress.ip_network(s)
+
+
+# TESTS
+
+
+def test_one_entry_serves_the_whole_network():
+    """every address inside a cached network is a hit"""
+    cache = NetworkCache(maxsize=10)
+    cache.put(net("81.2.64.0/18"), "GB")
+
+    assert cache.get("81.2.69.142") == (True, "GB")
+    assert cache.get("81.2.127.1") == (True, "GB")
+    assert cache.get("81.2.128.1") == (False, None)
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+
+def test_longest_prefix_wins():
+    """a more specific network overrides the one containing it"""
+    cache = NetworkCache(maxsize=10)
+    cache.put(net("10.0.0.0/8"), "US")
+    cache.put(net("10.1.2.0/24"), "SG")
+
+    assert cache.get("10.1.2.3") == (True, "SG")
+    assert cache.get("10.9.9.9") == (True, "US")
+
+
+def test_misses_and_ipv6_cached():
+    """unknown ranges are remembered too, v4 and v6 keys never collide"""
+    cache = NetworkCache(maxsize=10)
+    cache.put(net("192.0.2.0/24"), None)
+    cache.put(net("2001:4860::/32"), "US")
+
+    assert cache.get("192.0.2.1") == (True, None)
+    assert cache.get("2001:4860:4860::8888") == (True, "US")
+    assert cache.get("::c000:201") == (False, None)
+
+
+def test_bounded_lru():
+    """the least recently used network is evicted past the bound"""
+    cache = NetworkCache(maxsize=2)
+    cache.put(net("1.0.0.0/24"), "AU")
+    cache.put(net("2.0.0.0/24"), "FR")
+    cache.get("1.0.0.1")
+    cache.put(net("3.0.0.0/24"), "US")
+
+    assert cache.get("2.0.0.1") == (False, None)
+    assert cache.get("1.0.0.1") == (True, "AU")
+
+
+def test_invalid_address_rejected():
+    """anything that is not an ip address raises like `ipaddress` does"""
+    cache = NetworkCache(maxsize=2)
+
+    with pytest.raises(ValueError):
+        cache.get("not-an-ip")
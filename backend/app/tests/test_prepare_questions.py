@@ -1,4 +1,8 @@
 # tests/test_prepare_questions.py
+import asyncio
+import json
+import os
+
 import pandas as pd
 import pytest
 
@@ -31,35 +35,179 @@ def mock_question_df():
     )
 
 
-def _patch_read_csv(monkeypatch, df):
-    monkeypatch.setattr("app.utils.prepare_questions.pd.read_csv", lambda _path: df)
-
+def _use_bank(monkeypatch, df):
+    bank = prepare_questions.QuestionBank(prepare_questions.compile_frame(df))
+    monkeypatch.setattr(prepare_questions, "QUESTION_BANK", bank)
 
-@pytest.mark.asyncio
-async def test_load_questions_from_csv(monkeypatch, mock_question_df):
-    """Loads mock CSV and populates the question bank."""
-    _patch_read_csv(monkeypatch, mock_question_df)
 
-    await prepare_questions.load_questions_from_csv("fake.csv")
+def test_compiled_frame_populates_bank(monkeypatch, mock_question_df):
+    """A compiled frame serves random questions."""
+    _use_bank(monkeypatch, mock_question_df)
     assert len(prepare_questions.get_random_questions(amount=2)) == 2
 
 
-@pytest.mark.asyncio
-async def test_get_random_questions_no_res(monkeypatch, mock_question_df):
+def test_get_random_questions_no_res(monkeypatch, mock_question_df):
     """Returns empty list when genre doesn't match."""
-    _patch_read_csv(monkeypatch, mock_question_df)
-
-    await prepare_questions.load_questions_from_csv("fake.csv")
+    _use_bank(monkeypatch, mock_question_df)
     qs = prepare_questions.get_random_questions(genre="DOESNT EXIST")
     assert qs == []
 
 
-@pytest.mark.asyncio
-async def test_get_random_questions_with_genre(monkeypatch, mock_question_df):
+def test_get_random_questions_with_genre(monkeypatch, mock_question_df):
     """Returns one question filtered by genre."""
-    _patch_read_csv(monkeypatch, mock_question_df)
-
-    await prepare_questions.load_questions_from_csv("fake.csv")
+    _use_bank(monkeypatch, mock_question_df)
     qs = prepare_questions.get_random_questions(amount=1, genre="science")
     assert len(qs) == 1
     assert qs[0].genre.lower() == "science"
+
+
+def test_question_bank_columns(monkeypatch, mock_question_df):
+    """Rows are rebuilt from the flat columns with the right choices and answer."""
+    _use_bank(monkeypatch, mock_question_df)
+    bank = prepare_questions.QUESTION_BANK
+
+    assert len(bank) == 2
+    q = bank.get(1)
+    assert q.question == "Who discovered America?"
+    assert q.choices == ["Columbus", "Magellan", "Vespucci", "Da Gama"]
+    assert q.answer == 2
+    assert q.genre == "history"
+    # the pre-encoded fragment carries the same question and choices
+    assert json.loads("{" + q.frame + "}") == {
+        "question": q.question,
+        "choices": q.choices,
+    }
+    assert list(bank.by_genre["science"]) == [0]
+    assert prepare_questions.get_random_questions(genre="SCIENCE")[0].answer == 1
+
+
+@pytest.mark.asyncio
+async def test_load_question_bank_compiles_and_maps(tmp_path, mock_question_df):
+    """A missing bank is compiled from the CSV, then memory-mapped."""
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.to_csv(csv_path, index=False)
+
+    await prepare_questions.load_question_bank(str(csv_path))
+
+    assert (tmp_path / "quiz.qbank").exists()
+    assert prepare_questions.bank_loaded.is_set()
+    qs = prepare_questions.get_random_questions(amount=5, genre="history")
+    assert [q.question for q in qs] == ["Who discovered America?"]
+
+
+def test_rejects_foreign_buffer():
+    """Anything but a compiled bank is refused."""
+    with pytest.raises(ValueError):
+        prepare_questions.QuestionBank(b"genre,question,answer,a,b,c,d\n")
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_bank(tmp_path, mock_question_df):
+    """a reload publishes a new version, questions already sampled are kept"""
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.to_csv(csv_path, index=False)
+    await prepare_questions.load_question_bank(str(csv_path))
+    version = prepare_questions.bank_version
+    sampled = prepare_questions.get_random_questions(amount=2)
+
+    mock_question_df["question"] = ["New H2O?", "New America?"]
+    mock_question_df.to_csv(csv_path, index=False)
+    # the compiled bank must look stale next to the edited CSV
+    os.utime(tmp_path / "quiz.qbank", (0, 0))
+    await prepare_questions.load_question_bank(str(csv_path))
+
+    assert prepare_questions.bank_version == version + 1
+    assert {q.question for q in sampled} == {"What is H2O?", "Who discovered America?"}
+    assert {q.question for q in prepare_questions.get_random_questions(2)} == {
+        "New H2O?",
+        "New America?",
+    }
+
+
+@pytest.mark.asyncio
+async def test_empty_bank_not_swapped_in(tmp_path, mock_question_df):
+    """a reload that would leave no questions keeps the current bank"""
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.to_csv(csv_path, index=False)
+    await prepare_questions.load_question_bank(str(csv_path))
+
+    mock_question_df.iloc[:0].to_csv(csv_path, index=False)
+    os.utime(tmp_path / "quiz.qbank", (0, 0))
+    with pytest.raises(ValueError):
+        await prepare_questions.load_question_bank(str(csv_path))
+
+    assert len(prepare_questions.QUESTION_BANK) == 2
+    # the compiled bank on disk is still the good one
+    assert len(prepare_questions.QuestionBank.open(str(tmp_path / "quiz.qbank"))) == 2
+
+
+@pytest.mark.asyncio
+async def test_empty_bank_never_loaded(tmp_path, monkeypatch, mock_question_df):
+    """at startup an empty bank leaves matchmaking closed"""
+    monkeypatch.setattr(prepare_questions, "bank_loaded", asyncio.Event())
+    monkeypatch.setattr(
+        prepare_questions,
+        "QUESTION_BANK",
+        prepare_questions.QuestionBank(
+            prepare_questions.compile_columns([], [], [], [])
+        ),
+    )
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.iloc[:0].to_csv(csv_path, index=False)
+    bank_path = tmp_path / "quiz.qbank"
+    bank_path.write_bytes(prepare_questions.compile_columns([], [], [], []))
+
+    with pytest.raises(ValueError):
+        await prepare_questions.load_question_bank(str(csv_path))
+
+    assert not prepare_questions.bank_loaded.is_set()
+
+
+@pytest.mark.asyncio
+async def test_watcher_reloads_edited_csv(tmp_path, mock_question_df):
+    """the watcher swaps in the bank once an edited CSV has settled"""
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.to_csv(csv_path, index=False)
+    await prepare_questions.load_question_bank(str(csv_path))
+    version = prepare_questions.bank_version
+
+    watcher = asyncio.create_task(
+        prepare_questions.watch_question_bank(str(csv_path), interval=0.02)
+    )
+    await asyncio.sleep(0.05)
+    assert prepare_questions.bank_version == version
+
+    mock_question_df["question"] = ["New H2O?", "New America?"]
+    mock_question_df.to_csv(csv_path, index=False)
+    os.utime(tmp_path / "quiz.qbank", (0, 0))
+    for _ in range(100):
+        if prepare_questions.bank_version > version:
+            break
+        await asyncio.sleep(0.02)
+    watcher.cancel()
+
+    assert prepare_questions.bank_version == version + 1
+    assert prepare_questions.get_random_questions(1)[0].question.startswith("New")
+
+
+@pytest.mark.asyncio
+async def test_watcher_skips_bank_loaded_elsewhere(tmp_path, mock_question_df):
+    """an admin reload of an edited CSV is not reloaded again by the watcher"""
+    csv_path = tmp_path / "quiz.csv"
+    mock_question_df.to_csv(csv_path, index=False)
+    await prepare_questions.load_question_bank(str(csv_path))
+
+    watcher = asyncio.create_task(
+        prepare_questions.watch_question_bank(str(csv_path), interval=0.02)
+    )
+    await asyncio.sleep(0.05)
+    mock_question_df["question"] = ["New H2O?", "New America?"]
+    mock_question_df.to_csv(csv_path, index=False)
+    os.utime(tmp_path / "quiz.qbank", (0, 0))
+    await prepare_questions.load_question_bank(str(csv_path))
+    version = prepare_questions.bank_version
+
+    await asyncio.sleep(0.15)
+    watcher.cancel()
+
+    assert prepare_questions.bank_version == version
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.utils.profile_cache import ProfileCache
+
+
+class CountingLoader:
+    """Fake database read that counts how often it is hit"""
+
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"uid": "a", "elo": 1200, "type": "elf"}
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_load_is_cached():
+    """a second load of the same uid doesn't touch the database"""
+    cache = ProfileCache(maxsize=10, ttl=60)
+    loader = CountingLoader()
+
+    await cache.load("a", loader)
+    pdata = await cache.load("a", loader)
+
+    assert loader.calls == 1
+    assert pdata["elo"] == 1200
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_single_flight():
+    """concurrent loads of one uid are coalesced into a single read"""
+    cache = ProfileCache(maxsize=10, ttl=60)
+    loader = CountingLoader(delay=0.01)
+
+    results = await asyncio.gather(*(cache.load("a", loader) for _ in range(5)))
+
+    assert loader.calls == 1
+    assert all(r is results[0] for r in results)
+
+
+@pytest.mark.asyncio
+async def test_failed_load_not_cached():
+    """a failing read propagates and the next call retries"""
+    cache = ProfileCache(maxsize=10, ttl=60)
+
+    async def broken():
+        raise RuntimeError("firestore down")
+
+    with pytest.raises(RuntimeError):
+        await cache.load("a", broken)
+
+    loader = CountingLoader()
+    await cache.load("a", loader)
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_strand_waiters():
+    """cancelling the caller that started a load still answers the others"""
+    cache = ProfileCache(maxsize=10, ttl=60)
+    loader = CountingLoader(delay=0.05)
+
+    leader = asyncio.create_task(cache.load("a", loader))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.load("a", loader))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    pdata = await asyncio.wait_for(follower, 1)
+    assert pdata["elo"] == 1200
+    assert leader.cancelled()
+    assert loader.calls == 1
+    assert cache.get("a") is pdata
+
+
+def test_lru_eviction_and_ttl():
+    """the cache stays bounded and entries expire"""
+    cache = ProfileCache(maxsize=2, ttl=60)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert len(cache) == 2
+
+    expired = ProfileCache(maxsize=2, ttl=-1)
+    expired.put("a", {})
+    assert expired.get("a") is None
+
+
+def test_update_keeps_cache_coherent():
+    """writes are applied to the cached profile"""
+    cache = ProfileCache(maxsize=10, ttl=60)
+    cache.put("a", {"elo": 1200, "type": "elf"})
+
+    cache.update("a", elo=1232)
+    cache.update("missing", elo=1)
+
+    assert cache.get("a") == {"elo": 1232, "type": "elf"}
+    assert cache.get("missing") is None
@@ -0,0 +1,118 @@
+import json
+
+import msgpack
+
+from app.schemas.protocol import (
+    ANSWER,
+    CHAT,
+    END,
+    FOUND,
+    JSON,
+    MSGPACK,
+    QUESTION,
+    negotiate,
+)
+from app.utils.prepare_questions import Question, encode_frame_fragment
+
+
+def make_question() -> Question:
+    choices = ["a", "b", "c", "d"]
+    return Question(
+        question="what?",
+        choices=choices,
+        answer=2,
+        genre="science",
+        frame=encode_frame_fragment("what?", choices).decode(),
+    )
+
+
+# TESTS
+
+
+def test_negotiate_prefers_msgpack():
+    """msgpack is picked when offered, json is the fallback"""
+    assert negotiate(["trividuel.json.v1", "trividuel.msgpack.v1"]) == (
+        "trividuel.msgpack.v1",
+        MSGPACK,
+    )
+    assert negotiate(["trividuel.json.v1"]) == ("trividuel.json.v1", JSON)
+    assert negotiate([]) == (None, JSON)
+    assert negotiate(["graphql-ws"]) == (None, JSON)
+
+
+def test_question_frames_match():
+    """both codecs carry the same question, msgpack as a coded array"""
+    q = make_question()
+
+    as_json = json.loads(JSON.encode_question(3, 20, q))
+    assert as_json == {
+        "type": "game",
+        "message": "question",
+        "extra": {
+            "index": 3,
+            "question_timeout": 20,
+            "question": "what?",
+            "choices": ["a", "b", "c", "d"],
+        },
+    }
+    assert msgpack.unpackb(MSGPACK.encode_question(3, 20, q)) == [
+        QUESTION,
+        3,
+        20,
+        "what?",
+        ["a", "b", "c", "d"],
+    ]
+
+
+def test_msgpack_encodes_known_payloads():
+    """known messages lose their keys, unknown ones go out as maps"""
+    found = {"type": "game", "message": "found", "extra": {"session_id": "s1"}}
+    assert msgpack.unpackb(MSGPACK.encode(found)) == [FOUND, "s1"]
+
+    chat = {"type": "chat", "from": "p1", "text": "hi"}
+    assert msgpack.unpackb(MSGPACK.encode(chat)) == [CHAT, "p1", "hi"]
+
+    other = {"type": "notice", "text": "maintenance"}
+    assert msgpack.unpackb(MSGPACK.encode(other)) == other
+
+
+def test_msgpack_end_references_questions():
+    """the end frame drops the question text, keeping index and results"""
+    end = {
+        "type": "game",
+        "message": "end",
+        "extra": {
+            "winner": "p1",
+            "reason": "Ran Out of Lifes",
+            "elo_delta": (16, -16),
+            "questions": [
+                {
+                    "index": 0,
+                    "question:": "what?",
+                    "correct_ans": "c",
+                    "player_correct": {"p1": True, "p2": False},
+                }
+            ],
+        },
+    }
+    frame = MSGPACK.encode(end)
+
+    assert msgpack.unpackb(frame) == [
+        END,
+        "p1",
+        "Ran Out of Lifes",
+        [16, -16],
+        [[0, {"p1": True, "p2": False}]],
+    ]
+    assert len(frame) < len(JSON.encode(end)) / 2
+
+
+def test_msgpack_decodes_client_messages():
+    """client arrays come out in the shape the session handles for json"""
+    assert MSGPACK.decode(msgpack.packb([ANSWER, 2])) == {
+        "type": "answer",
+        "choice": 2,
+    }
+    assert MSGPACK.decode(msgpack.packb([CHAT, "gg"])) == {"type": "chat", "text": "gg"}
+    assert MSGPACK.decode(msgpack.packb([99])) == {"type": 99}
+    assert MSGPACK.decode(msgpack.packb({"type": "answer"})) == {"type": None}
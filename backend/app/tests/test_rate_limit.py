@@ -0,0 +1,63 @@
+from app.schemas.rate_limit import OTHER, InboundLimiter, TokenBucket, dropped_counter
+from app.utils import metrics
+
+LIMITS = {"answer": (2, 2), "chat": (1, 3), OTHER: (1, 1)}
+
+
+# TESTS
+
+
+def test_bucket_burst_then_refill():
+    """a bucket allows its burst, then refills at its rate"""
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket.updated
+
+    assert [bucket.take(now) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(now + 0.25) is False
+    assert bucket.take(now + 0.5) is True
+    # idle time never banks more than the burst
+    assert sum(bucket.take(now + 60) for _ in range(5)) == 3
+
+
+def test_types_limited_independently():
+    """flooding chat leaves answers untouched"""
+    limiter = InboundLimiter(LIMITS)
+    now = 1e9
+
+    chats = [limiter.allow("chat", now) for _ in range(10)]
+    assert chats.count(True) == 3
+    assert limiter.allow("answer", now) is True
+    assert limiter.dropped == 7
+
+
+def test_unknown_types_share_a_bucket():
+    """unlisted and malformed types all draw from the catch-all bucket"""
+    limiter = InboundLimiter(LIMITS)
+    now = 1e9
+
+    assert limiter.allow("emote", now) is True
+    assert limiter.allow(["not", "hashable"], now) is False
+    assert limiter.allow(None, now) is False
+    assert set(limiter.buckets) == {OTHER}
+
+
+def test_no_catch_all_leaves_other_types_unlimited():
+    """a config without "*" only limits the types it lists"""
+    limiter = InboundLimiter({"chat": (0.5, 3)})
+    now = 1e9
+
+    assert all(limiter.allow("answer", now) for _ in range(20))
+    assert [limiter.allow("chat", now) for _ in range(4)].count(True) == 3
+    assert set(limiter.buckets) == {"chat"}
+
+
+def test_drops_are_counted():
+    """every dropped message increments its type's exported counter"""
+    limiter = InboundLimiter(LIMITS)
+    before = dropped_counter("chat").value
+
+    for _ in range(5):
+        limiter.allow("chat", 1e9)
+
+    assert dropped_counter("chat").value == before + 2
+    assert 'trividuel_inbound_dropped_total{type="chat"}' in metrics.render()
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.utils.result_writer import MAX_BATCH_WRITES, ResultWriter
+
+
+class DummyBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, doc, payload, merge=False):
+        self.writes.append((doc, payload, merge))
+
+    async def commit(self):
+        await asyncio.sleep(self.db.latency)
+        if self.db.failures:
+            self.db.failures -= 1
+            raise RuntimeError("deadline exceeded")
+        self.db.commits.append(self.writes)
+
+
+class DummyCollection:
+    def document(self, uid):
+        return uid
+
+
+class DummyDB:
+    """Records committed batches, optionally failing the first few commits"""
+
+    def __init__(self, failures: int = 0, latency: float = 0):
+        self.failures = failures
+        self.latency = latency
+        self.commits = []
+
+    def batch(self):
+        return DummyBatch(self)
+
+    def collection(self, _name):
+        return DummyCollection()
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_writes_coalesced_per_player():
+    """several results for one player end up as a single merged write"""
+    db = DummyDB()
+    writer = ResultWriter(db)
+
+    writer.submit("a", {"elo": 1210, "total_won": 1})
+    writer.submit("b", {"elo": 1190})
+    writer.submit("a", {"elo": 1225})
+    await writer.flush()
+
+    assert db.commits == [
+        [("a", {"elo": 1225, "total_won": 1}, True), ("b", {"elo": 1190}, True)]
+    ]
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_batches_respect_firestore_limit():
+    """a large backlog is split into batches of at most 500 writes"""
+    db = DummyDB()
+    writer = ResultWriter(db)
+
+    for i in range(MAX_BATCH_WRITES + 1):
+        writer.submit(str(i), {"elo": i})
+    await writer.flush()
+
+    assert [len(c) for c in db.commits] == [MAX_BATCH_WRITES, 1]
+
+
+@pytest.mark.asyncio
+async def test_commit_retried_with_backoff():
+    """transient failures are retried"""
+    db = DummyDB(failures=2)
+    writer = ResultWriter(db, backoff=0)
+
+    writer.submit("a", {"elo": 1210})
+    await writer.flush()
+
+    assert len(db.commits) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_requeued():
+    """writes that ran out of retries stay pending, newer writes win"""
+    db = DummyDB(failures=2)
+    writer = ResultWriter(db, max_retries=2, backoff=0)
+
+    writer.submit("a", {"elo": 1210, "total_won": 3})
+    await writer.flush()
+    writer.submit("a", {"elo": 1230})
+    await writer.close()
+
+    assert db.commits == [[("a", {"elo": 1230, "total_won": 3}, True)]]
+
+
+@pytest.mark.asyncio
+async def test_uncommitted_writes_visible_until_committed():
+    """queued and committing writes can be overlaid on what the database returns"""
+    db = DummyDB(latency=0.05)
+    writer = ResultWriter(db)
+
+    writer.submit("a", {"elo": 1210, "total_won": 3})
+    assert writer.pending("a") == {"elo": 1210, "total_won": 3}
+    assert writer.pending("b") is None
+
+    flush = asyncio.create_task(writer.flush())
+    await asyncio.sleep(0.01)
+    # the first write is committing, a newer one is queued behind it
+    writer.submit("a", {"elo": 1230})
+    assert writer.pending("a") == {"elo": 1230, "total_won": 3}
+    assert writer.uncommitted() == {"a"}
+
+    await flush
+    await writer.flush()
+    assert writer.pending("a") is None
+    assert writer.uncommitted() == set()
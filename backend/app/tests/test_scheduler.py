@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from app.schemas.scheduler import SessionScheduler
+
+
+class Recorder:
+    """Collects fired callbacks with the time they fired at"""
+
+    def __init__(self):
+        self.fired = []
+
+    def make(self, name: str):
+        async def callback():
+            self.fired.append((name, time.monotonic()))
+
+        return callback
+
+
+async def run_for(scheduler: SessionScheduler, seconds: float):
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_callbacks_fire_in_deadline_order():
+    """callbacks run once their deadline passes, earliest first"""
+    sched = SessionScheduler(tick=0.01, slots=8)
+    rec = Recorder()
+    start = time.monotonic()
+    sched.schedule("a", 0.05, rec.make("a"))
+    sched.schedule("b", 0.02, rec.make("b"))
+
+    await run_for(sched, 0.1)
+
+    assert [name for name, _ in rec.fired] == ["b", "a"]
+    assert rec.fired[1][1] - start >= 0.05
+    assert len(sched) == 0
+
+
+@pytest.mark.asyncio
+async def test_reschedule_replaces_deadline():
+    """a session only ever has one pending deadline"""
+    sched = SessionScheduler(tick=0.01, slots=8)
+    rec = Recorder()
+    sched.schedule("s", 0.02, rec.make("reveal"))
+    sched.schedule("s", 0.03, rec.make("next"))
+
+    await run_for(sched, 0.08)
+
+    assert [name for name, _ in rec.fired] == ["next"]
+
+
+@pytest.mark.asyncio
+async def test_cancel():
+    """cancelled sessions never fire"""
+    sched = SessionScheduler(tick=0.01, slots=8)
+    rec = Recorder()
+    sched.schedule("s", 0.02, rec.make("reveal"))
+    sched.cancel("s")
+    sched.cancel("unknown")
+
+    await run_for(sched, 0.05)
+
+    assert rec.fired == []
+    assert "s" not in sched
+
+
+@pytest.mark.asyncio
+async def test_deadline_beyond_one_wheel_turn():
+    """delays longer than the wheel wait out extra rounds"""
+    sched = SessionScheduler(tick=0.01, slots=4)
+    rec = Recorder()
+    start = time.monotonic()
+    sched.schedule("s", 0.1, rec.make("late"))
+
+    await run_for(sched, 0.15)
+
+    assert len(rec.fired) == 1
+    assert rec.fired[0][1] - start >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_failing_callback_keeps_loop_running():
+    """one session blowing up doesn't stop the others"""
+    sched = SessionScheduler(tick=0.01, slots=8)
+    rec = Recorder()
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    sched.schedule("a", 0.01, broken)
+    sched.schedule("b", 0.01, rec.make("b"))
+
+    await run_for(sched, 0.05)
+
+    assert [name for name, _ in rec.fired] == ["b"]
@@ -0,0 +1,168 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+import pytest
+
+from app.state.hub import StateHub, read_message, write_message
+
+
+class DummyWorker:
+    """Raw hub connection standing in for a worker process"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, path):
+        return cls(*await asyncio.open_unix_connection(str(path)))
+
+    def send(self, **msg):
+        write_message(self.writer, msg)
+
+    async def recv(self):
+        msg, _ = await asyncio.wait_for(read_message(self.reader), 1)
+        return msg
+
+    async def call(self, **msg):
+        self.send(rid=1, **msg)
+        return await self.recv()
+
+    def close(self):
+        self.writer.close()
+
+
+def describe(uid, elo=1200):
+    return {
+        "uid": uid,
+        "name": uid,
+        "type": "elf",
+        "elo": elo,
+        "country": "SG",
+        "total_won": 0,
+    }
+
+
+@asynccontextmanager
+async def running_hub(tmp_path):
+    path = tmp_path / "hub.sock"
+    hub = StateHub()
+    task = asyncio.create_task(hub.serve(str(path)))
+    while not path.exists():
+        await asyncio.sleep(0.01)
+    try:
+        yield hub, path
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive_across_workers(tmp_path):
+    """a uid can only be online on one worker at a time"""
+    async with running_hub(tmp_path) as (_, path):
+        a, b = await DummyWorker.connect(path), await DummyWorker.connect(path)
+
+        assert (await a.call(op="claim", uid="p1"))["ok"] is True
+        assert (await b.call(op="claim", uid="p1"))["ok"] is False
+        assert (await b.call(op="count"))["count"] == 1
+
+        a.send(op="release", uid="p1")
+        assert (await b.call(op="claim", uid="p1"))["ok"] is True
+        a.close()
+        b.close()
+
+
+@pytest.mark.asyncio
+async def test_pairs_across_workers_and_relays_frames(tmp_path):
+    """players on different workers are matched, frames flow both ways"""
+    async with running_hub(tmp_path) as (_, path):
+        a, b = await DummyWorker.connect(path), await DummyWorker.connect(path)
+        await a.call(op="claim", uid="p1")
+        await b.call(op="claim", uid="p2")
+
+        a.send(op="enqueue", player=describe("p1", 1100))
+        b.send(op="enqueue", player=describe("p2", 1300))
+
+        # the session runs on the worker of the lower rated player
+        assert await b.recv() == {"op": "attach", "uid": "p2"}
+        match = await a.recv()
+        assert match["op"] == "match"
+        assert [p["uid"] for p in match["players"]] == ["p1", "p2"]
+        assert match["remote"] == [False, True]
+
+        a.send(op="send", uid="p2", frame='{"type":"game"}')
+        assert await b.recv() == {"op": "send", "uid": "p2", "frame": '{"type":"game"}'}
+
+        b.send(op="inbound", uid="p2", data={"type": "answer", "choice": 1})
+        assert (await a.recv())["data"] == {"type": "answer", "choice": 1}
+
+        a.send(op="ended", uid="p2")
+        assert await b.recv() == {"op": "detach", "uid": "p2"}
+        a.close()
+        b.close()
+
+
+@pytest.mark.asyncio
+async def test_dead_worker_releases_players_and_sessions(tmp_path):
+    """a worker going away frees its players and aborts the sessions it hosted"""
+    async with running_hub(tmp_path) as (hub, path):
+        a, b = await DummyWorker.connect(path), await DummyWorker.connect(path)
+        await a.call(op="claim", uid="p1")
+        await b.call(op="claim", uid="p2")
+        a.send(op="enqueue", player=describe("p1", 1100))
+        b.send(op="enqueue", player=describe("p2", 1300))
+        await b.recv()
+        await a.recv()
+
+        a.close()
+
+        assert await b.recv() == {"op": "detach", "uid": "p2", "abort": True}
+        assert "p1" not in hub.online
+        assert hub.routes == {}
+        b.close()
+
+
+@pytest.mark.asyncio
+async def test_release_while_paired_settles_the_session(tmp_path):
+    """a player leaving before their worker saw the attach still counts as left"""
+    async with running_hub(tmp_path) as (hub, path):
+        a, b = await DummyWorker.connect(path), await DummyWorker.connect(path)
+        await a.call(op="claim", uid="p1")
+        await b.call(op="claim", uid="p2")
+        a.send(op="enqueue", player=describe("p1", 1100))
+        b.send(op="enqueue", player=describe("p2", 1300))
+        await a.recv()
+
+        # p2's worker never routed the leave, it only releases
+        b.send(op="release", uid="p2")
+
+        assert await a.recv() == {"op": "left", "uid": "p2"}
+        assert hub.routes == {}
+        a.close()
+        b.close()
+
+
+@pytest.mark.asyncio
+async def test_left_is_relayed_once(tmp_path):
+    """a routed leave followed by the release reaches the host only once"""
+    async with running_hub(tmp_path) as (hub, path):
+        a, b = await DummyWorker.connect(path), await DummyWorker.connect(path)
+        await a.call(op="claim", uid="p1")
+        await b.call(op="claim", uid="p2")
+        a.send(op="enqueue", player=describe("p1", 1100))
+        b.send(op="enqueue", player=describe("p2", 1300))
+        await b.recv()
+        await a.recv()
+
+        b.send(op="left", uid="p2")
+        b.send(op="release", uid="p2")
+
+        assert await a.recv() == {"op": "left", "uid": "p2"}
+        assert (await a.call(op="count"))["count"] == 1
+        a.close()
+        b.close()
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.schemas.gamesession import SessionManager
+from app.schemas.matchmaking import MatchmakingQueue
+from app.schemas.players import Player, PlayerManager
+from app.state.shared import SharedStateBackend
+
+
+class DummyWebSocket:
+    async def send_text(self, data):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+def describe(uid, elo=1200):
+    return {
+        "uid": uid,
+        "name": uid,
+        "type": "elf",
+        "elo": elo,
+        "country": "SG",
+        "total_won": 0,
+        "protocol": "json",
+    }
+
+
+def make_backend():
+    players = PlayerManager()
+    backend = SharedStateBackend(
+        players, MatchmakingQueue(), SessionManager(), socket_path="unused"
+    )
+    sent = []
+    backend._send = lambda msg: sent.append(msg) or True
+    players.add(Player(uid="p1", ws=DummyWebSocket(), type="elf", elo=1100))
+    return backend, sent
+
+
+# TESTS
+
+
+@pytest.mark.asyncio
+async def test_left_before_game_started_drops_the_pair():
+    """a remote opponent leaving right after the match never gets a game"""
+    backend, sent = make_backend()
+
+    await backend._dispatch(
+        {
+            "op": "match",
+            "players": [describe("p1"), describe("p2")],
+            "remote": [False, True],
+        }
+    )
+    await backend._dispatch({"op": "left", "uid": "p2"})
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(backend.next_pairs(), 0.05)
+    assert [(m["op"], m["player"]["uid"]) for m in sent] == [("requeue", "p1")]
+
+
+@pytest.mark.asyncio
+async def test_host_leaving_before_game_started_requeues_opponent():
+    """the hosting player leaving first sends the remote opponent back in the queue"""
+    backend, sent = make_backend()
+
+    await backend._dispatch(
+        {
+            "op": "match",
+            "players": [describe("p1"), describe("p2")],
+            "remote": [False, True],
+        }
+    )
+    await backend.leave("p1")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(backend.next_pairs(), 0.05)
+    assert [(m["op"], m["player"]["uid"]) for m in sent] == [("requeue", "p2")]
+
+
+@pytest.mark.asyncio
+async def test_pairs_are_handed_out_together():
+    """next_pairs returns every game the hub paired since the last call"""
+    backend, _ = make_backend()
+    backend.players.add(Player(uid="p3", ws=DummyWebSocket(), type="elf"))
+
+    for host, opponent in (("p1", "p2"), ("p3", "p4")):
+        await backend._dispatch(
+            {
+                "op": "match",
+                "players": [describe(host), describe(opponent)],
+                "remote": [False, True],
+            }
+        )
+
+    pairs = await asyncio.wait_for(backend.next_pairs(), 1)
+    assert [(a.uid, b.uid) for a, b in pairs] == [("p1", "p2"), ("p3", "p4")]
@@ -1,19 +1,31 @@
-from functools import lru_cache
-
 import geoip2.errors
-from geoip2.database import Reader
+from geoip2.database import MODE_AUTO, Reader
 
 from app.config import settings
+from app.utils.network_cache import NetworkCache
+
+# the C extension over a memory map when available, so lookups stay fast
+# and every worker shares the same database pages
+_READER = Reader(settings.geoloc_data_path, mode=MODE_AUTO)
 
-_READER = Reader(settings.geoloc_data_path)
+# keyed by the network each record covers, not by address string
+_CACHE = NetworkCache(maxsize=settings.GEOIP_CACHE_SIZE)
 
 
-@lru_cache(maxsize=100_000)
 def find_country_by_ip(client_ip: str) -> str | None:
     """Return 'US', 'SG'... 'DEV' / 'IDK' otherwise"""
     if client_ip.startswith("127."):
         return "DEV"
+    # the cache parses the address itself, a hit never builds an ipaddress object
+    found, country = _CACHE.get(client_ip)
+    if found:
+        return country
     try:
-        return _READER.country(client_ip).country.iso_code
-    except geoip2.errors.AddressNotFoundError:
-        return "IDK"
+        record = _READER.country(client_ip)
+        country, network = record.country.iso_code, record.traits.network
+    except geoip2.errors.AddressNotFoundError as e:
+        # the miss is valid for the whole gap the database reports
+        country, network = "IDK", e.network
+    if network is not None:
+        _CACHE.put(network, country)
+    return country
@@ -3,6 +3,9 @@ from typing import Tuple
 
 from app.config import settings
 from app.schemas.players import Player
+from app.utils.log import get_logger
+
+log = get_logger("elo")
 
 
 def elo_calculation(
@@ -47,14 +50,16 @@ def elo_calculation(
 
     winner_delta: int = abs(winner_new - winner.elo)
     loser_delta: int = abs(loser_new - loser.elo)
-    # TODO LOGGING
-    print(
-        f"{winner.name:>10}: {winner.elo} -> {winner_new}  "
-        f"(K={k_win:.1f},  Δ={winner_delta})"
-    )
-    print(
-        f"{loser.name:>10}: {loser.elo} -> {loser_new}   "
-        f"(K={k_los:.1f},  Δ={loser_delta})"
+    log.info(
+        "elo_update",
+        winner=winner.uid,
+        winner_elo=winner.elo,
+        winner_new=winner_new,
+        winner_k=round(k_win, 1),
+        loser=loser.uid,
+        loser_elo=loser.elo,
+        loser_new=loser_new,
+        loser_k=round(k_los, 1),
     )
 
     return winner_new, loser_new, winner_delta, loser_delta
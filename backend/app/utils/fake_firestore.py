@@ -0,0 +1,152 @@
+import asyncio
+import random
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict]):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, db: "FakeFirestore", collection: str, doc_id: str):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    async def get(self) -> FakeDocumentSnapshot:
+        await self._db._io()
+        return FakeDocumentSnapshot(self.id, self._db._read(self._collection, self.id))
+
+    async def set(self, data: Dict, merge: bool = False):
+        await self._db._io()
+        self._db._write(self._collection, self.id, data, merge)
+
+    async def update(self, data: Dict):
+        await self._db._io()
+        self._db._update(self._collection, self.id, data)
+
+
+class FakeCollectionReference:
+    def __init__(self, db: "FakeFirestore", name: str):
+        self._db = db
+        self.name = name
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, self.name, doc_id)
+
+    async def stream(self) -> AsyncIterator[FakeDocumentSnapshot]:
+        docs = self._db._collections.get(self.name, {})
+        # the real client pages through the collection, one round trip per page
+        items = list(docs.items())
+        for i, (doc_id, data) in enumerate(items):
+            if i % self._db.STREAM_PAGE_SIZE == 0:
+                await self._db._io()
+            yield FakeDocumentSnapshot(doc_id, dict(data))
+
+
+class FakeWriteBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes: List[Tuple[str, FakeDocumentReference, Dict, bool]] = []
+
+    def set(self, doc: FakeDocumentReference, data: Dict, merge: bool = False):
+        self._writes.append(("set", doc, data, merge))
+
+    def update(self, doc: FakeDocumentReference, data: Dict):
+        self._writes.append(("update", doc, data, False))
+
+    async def commit(self):
+        # one round trip, applied all or nothing
+        await self._db._io()
+        for op, doc, _, _ in self._writes:
+            if op == "update" and self._db._read(doc._collection, doc.id) is None:
+                raise NotFound(f"No document to update: {doc.id}")
+        for op, doc, data, merge in self._writes:
+            if op == "update":
+                self._db._update(doc._collection, doc.id, data)
+            else:
+                self._db._write(doc._collection, doc.id, data, merge)
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the subset of firestore's `AsyncClient` the
+    backend uses, for running and benchmarking without credentials or network.
+
+    Every round trip (document get/set/update, batch commit, each page of a
+    stream) sleeps `latency` seconds plus up to `jitter`, then fails with
+    probability `failure_rate` the way an unavailable backend would.
+    """
+
+    STREAM_PAGE_SIZE = 300
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        # collection -> document id -> fields
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+        self.calls = 0
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    async def _io(self):
+        self.calls += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise ServiceUnavailable("injected failure")
+
+    def _read(self, collection: str, doc_id: str) -> Optional[Dict]:
+        return self._collections.get(collection, {}).get(doc_id)
+
+    def _write(self, collection: str, doc_id: str, data: Dict, merge: bool):
+        docs = self._collections.setdefault(collection, {})
+        if merge and doc_id in docs:
+            docs[doc_id] = docs[doc_id] | data
+        else:
+            docs[doc_id] = dict(data)
+
+    def _update(self, collection: str, doc_id: str, data: Dict):
+        current = self._read(collection, doc_id)
+        if current is None:
+            raise NotFound(f"No document to update: {doc_id}")
+        current.update(data)
+
+    def seed_players(self, count: int, types: List[str]):
+        """Fill the players collection, so leaderboard rescans have work to do."""
+        countries = ["SG", "US", "GB", "MY", "IDK"]
+        players = self._collections.setdefault("players", {})
+        for i in range(count):
+            uid = f"seed-{i}"
+            players[uid] = {
+                "uid": uid,
+                "elo": self._random.randint(800, 2000),
+                "display_name": uid,
+                "type": self._random.choice(types),
+                "total_won": self._random.randint(0, 200),
+                "country": self._random.choice(countries),
+            }
@@ -0,0 +1,118 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
+
+import orjson
+
+ROOT = "trividuel"
+
+# event name -> fraction of records kept, events not listed are always kept
+_sample_rates: Dict[str, float] = {}
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per line: ts, level, logger, event, then the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # the stock handler formats the message on the caller's thread,
+    # here the record is handed over as is and formatted by the listener
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class EventLogger:
+    """
+    Logs named events with structured fields, e.g.
+    `log.info("session_ended", session_id=sid, duration=12.5)`.
+
+    A disabled level or a sampled out event returns before a record is
+    built. Enabled records are queued as is, formatting and writing happen
+    on the listener thread, so a slow stdout never stalls the event loop.
+    """
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"{ROOT}.{name}")
+
+    def _log(self, level: int, event: str, exc_info: bool, fields: Dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, False, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, False, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, False, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, False, fields)
+
+    def exception(self, event: str, **fields):
+        """Error with the traceback of the exception being handled."""
+        self._log(logging.ERROR, event, True, fields)
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+
+def configure_logging(
+    level: str = "INFO",
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream: Optional[TextIO] = None,
+):
+    """Route every trividuel logger through a queue to a background writer thread."""
+    global _listener
+    shutdown_logging()
+    _sample_rates.clear()
+    _sample_rates.update(sample_rates or {})
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+
+    root = logging.getLogger(ROOT)
+    root.handlers = [_DeferredQueueHandler(records)]
+    root.setLevel(level.upper())
+    # uvicorn configures the root logger, don't print everything twice
+    root.propagate = False
+
+    _listener = QueueListener(records, handler)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Stop the writer thread once everything queued is written."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
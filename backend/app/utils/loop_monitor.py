@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.metrics import LOOP_LAG, LOOP_STALLS
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag and profiles whatever is blocking the loop.
+
+    A heartbeat coroutine wakes every `interval`, how late it wakes is the loop
+    lag. A watchdog thread checks the heartbeat and, once the loop has been
+    stuck for longer than `threshold`, samples the loop thread's stack with
+    `sys._current_frames`. Samples are aggregated per stack, so the report
+    ranks the calls by how long they held the loop.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        sample_interval: float = 0.01,
+        depth: int = 12,
+        max_stacks: int = 200,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.sample_interval = sample_interval
+        self.depth = depth
+        self.max_stacks = max_stacks
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        self._loop_thread: Optional[int] = None
+        self._beat = time.monotonic()
+        self._stopped = threading.Event()
+        # written by the watchdog thread, read by the debug endpoint
+        self._lock = threading.Lock()
+        self._stacks: Dict[Tuple[str, ...], int] = {}
+        self._dropped = 0
+
+    def start(self):
+        """Start monitoring the running loop, call from within it."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _heartbeat(self):
+        while not self._stopped.is_set():
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = time.monotonic()
+            lag = max(0.0, self._beat - before - self.interval)
+            LOOP_LAG.observe(lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                self.max_lag = max(self.max_lag, lag)
+                LOOP_STALLS.inc()
+
+    def _watch(self):
+        while not self._stopped.wait(self.sample_interval):
+            if time.monotonic() - self._beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        stack = tuple(
+            f"{fs.filename}:{fs.lineno} {fs.name}"
+            for fs in traceback.extract_stack(frame, limit=self.depth)
+        )
+        with self._lock:
+            if stack in self._stacks:
+                self._stacks[stack] += 1
+            elif len(self._stacks) < self.max_stacks:
+                self._stacks[stack] = 1
+            else:
+                self._dropped += 1
+
+    def report(self, limit: int = 20) -> Dict:
+        """The stacks seen blocking the loop, longest blocked first."""
+        with self._lock:
+            top = sorted(self._stacks.items(), key=lambda kv: kv[1], reverse=True)
+            dropped = self._dropped
+        offenders: List[Dict] = [
+            {
+                "blocked_seconds": round(samples * self.sample_interval, 3),
+                "samples": samples,
+                # innermost call last
+                "stack": list(stack),
+            }
+            for stack, samples in top[:limit]
+        ]
+        return {
+            "threshold": self.threshold,
+            "stalls": self.stalls,
+            "max_lag": round(self.max_lag, 3),
+            "dropped_samples": dropped,
+            "offenders": offenders,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._dropped = 0
+        self.stalls = 0
+        self.max_lag = 0.0
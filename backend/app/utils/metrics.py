@@ -0,0 +1,178 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+# seconds, from a frame write on a local socket up to a slow leaderboard rescan
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, **labels: str):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, **labels: str):
+        super().__init__(name, help, **labels)
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels)} {self.value}"]
+
+
+class Gauge(Metric):
+    """A value that is set, or read from `fn` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Optional[Callable[[], float]] = None,
+        **labels: str,
+    ):
+        super().__init__(name, help, **labels)
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self) -> List[str]:
+        value = self.fn() if self.fn else self.value
+        return [f"{self.name}{_labels(self.labels)} {value}"]
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. Observing is a bisect and two additions on
+    preallocated slots, with no lock since everything runs on the event loop,
+    so it is cheap enough for per-frame hot paths.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **labels: str,
+    ):
+        super().__init__(name, help, **labels)
+        self.buckets = tuple(buckets)
+        # one slot per bucket plus +Inf, cumulated at scrape time
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def samples(self) -> List[str]:
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labels, le=le)} {total}")
+        lines.append(f"{self.name}_sum{_labels(self.labels)} {self.sum}")
+        lines.append(f"{self.name}_count{_labels(self.labels)} {total}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+REGISTRY: List[Metric] = []
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines, described = [], set()
+    # labelled series of one metric are listed together
+    for metric in sorted(REGISTRY, key=lambda m: m.name):
+        if metric.name not in described:
+            described.add(metric.name)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------ hot path metrics
+QUEUE_WAIT = Histogram(
+    "trividuel_time_to_match_seconds", "Time players spend queued before a match"
+)
+SEND_LATENCY = Histogram(
+    "trividuel_frame_send_seconds",
+    "Time from a frame being broadcast to it being written to the socket",
+)
+FIRESTORE_LOAD_PLAYER = Histogram(
+    "trividuel_firestore_seconds", "Firestore call latency", op="load_player"
+)
+FIRESTORE_COMMIT_RESULTS = Histogram(
+    "trividuel_firestore_seconds", "Firestore call latency", op="commit_results"
+)
+FIRESTORE_STREAM_PLAYERS = Histogram(
+    "trividuel_firestore_seconds", "Firestore call latency", op="stream_players"
+)
+LEADERBOARD_REFRESH = Histogram(
+    "trividuel_leaderboard_refresh_seconds", "Duration of full leaderboard rescans"
+)
+LOOP_LAG = Histogram(
+    "trividuel_loop_lag_seconds", "How late the event loop runs a timer callback"
+)
+LOOP_STALLS = Counter(
+    "trividuel_loop_stalls_total", "Times the event loop was blocked past the threshold"
+)
@@ -0,0 +1,71 @@
+import ipaddress
+import socket
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# (ip version, prefix length, address >> host bits)
+NetworkKey = Tuple[int, int, int]
+
+
+def parse_address(ip: str) -> Tuple[int, int]:
+    """(ip version, address as an int), several times cheaper than `ipaddress`."""
+    v6 = ":" in ip
+    try:
+        packed = socket.inet_pton(socket.AF_INET6 if v6 else socket.AF_INET, ip)
+    except OSError:
+        raise ValueError(f"{ip!r} does not appear to be an IPv4 or IPv6 address")
+    return (6 if v6 else 4), int.from_bytes(packed, "big")
+
+
+class NetworkCache:
+    """
+    LRU cache of lookup results keyed by the network they hold for.
+
+    A GeoIP record is valid for the whole network the database returns with
+    it, so one entry answers every address in that /24, /16 or /48 instead
+    of one entry per address string. A lookup masks the address with each
+    prefix length the cache holds, longest first - databases only use a
+    handful of distinct lengths.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[NetworkKey, Optional[str]] = OrderedDict()
+        # ip version -> prefix lengths present, longest first
+        self._prefixes: Dict[int, List[int]] = {4: [], 6: []}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, ip: str) -> Tuple[bool, Optional[str]]:
+        """(found, value) for the cached network containing the address `ip`."""
+        version, value = parse_address(ip)
+        bits = 32 if version == 4 else 128
+        for prefix_len in self._prefixes[version]:
+            key = (version, prefix_len, value >> (bits - prefix_len))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, network: IPNetwork, value: Optional[str]):
+        bits, prefix_len = network.max_prefixlen, network.prefixlen
+        key = (
+            network.version,
+            prefix_len,
+            int(network.network_address) >> (bits - prefix_len),
+        )
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        prefixes = self._prefixes[network.version]
+        if prefix_len not in prefixes:
+            prefixes.append(prefix_len)
+            prefixes.sort(reverse=True)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
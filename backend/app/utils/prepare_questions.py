@@ -1,49 +1,327 @@
+import asyncio
+import mmap
+import os
 import random
-from typing import List, Optional
+import struct
+import sys
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
+import orjson
 import pandas as pd
-from pydantic import BaseModel
 
+from app.utils.log import get_logger
 
-class Question(BaseModel):
+CHOICE_COLUMNS = ["a", "b", "c", "d"]
+N_CHOICES = len(CHOICE_COLUMNS)
+# question text, its choices, then the pre-encoded wire fragment
+STRINGS_PER_ROW = 1 + N_CHOICES + 1
+
+log = get_logger("questions")
+
+# compiled bank layout, every section starts 4-byte aligned:
+#   header       magic, version, choices per row, rows, genres
+#   offsets      u32[strings + 1]  string k is heap[offsets[k]:offsets[k + 1]]
+#                                  genre names first, then STRINGS_PER_ROW per row
+#                                  (question, choices, json frame fragment)
+#   genre_start  u32[genres + 1]   genre g owns genre_rows[start[g]:start[g + 1]]
+#   genre_rows   u32[rows]         row numbers grouped by genre
+#   genre_ids    u16[rows]
+#   answers      u8[rows]
+#   heap         utf-8 string bytes
+MAGIC = b"TVQB"
+VERSION = 2
+_HEADER = struct.Struct("<4sHHII")
+
+# the sections are written and read in native order, the format is little endian
+assert sys.byteorder == "little", "compiled question banks are little endian"
+
+
+class Question(NamedTuple):
     question: str
     choices: List[str]
     answer: int
     genre: str
+    # `"question":...,"choices":[...]` already json encoded, spliced into question frames
+    frame: str = ""
+
+
+def encode_frame_fragment(question: str, choices: List[str]) -> bytes:
+    """Encode the session independent part of a question frame, without braces."""
+    return orjson.dumps({"question": question, "choices": choices})[1:-1]
+
+
+def _align(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def compile_columns(
+    questions: List[str],
+    choices: List[List[str]],
+    answers: Sequence[int],
+    genres: List[str],
+) -> bytes:
+    """Pack question columns into the compiled bank format."""
+    genre_names = sorted(set(genres))
+    genre_ids = {g: i for i, g in enumerate(genre_names)}
+
+    heap = bytearray()
+    offsets = array("I", [0])
+
+    def put(s: bytes):
+        heap.extend(s)
+        offsets.append(len(heap))
+
+    for name in genre_names:
+        put(name.encode())
+    for question, row_choices in zip(questions, choices):
+        put(question.encode())
+        for c in row_choices:
+            put(c.encode())
+        put(encode_frame_fragment(question, row_choices))
 
+    row_genres = array("H", (genre_ids[g] for g in genres))
+    genre_rows = array("I", sorted(range(len(genres)), key=row_genres.__getitem__))
+    genre_start = array("I", [0] * (len(genre_names) + 1))
+    for g in row_genres:
+        genre_start[g + 1] += 1
+    for g in range(len(genre_names)):
+        genre_start[g + 1] += genre_start[g]
 
-QUESTION_BANK: List[Question] = []
+    out = bytearray(
+        _HEADER.pack(MAGIC, VERSION, N_CHOICES, len(questions), len(genre_names))
+    )
+    sections = [
+        offsets,
+        genre_start,
+        genre_rows,
+        row_genres,
+        array("B", answers),
+        heap,
+    ]
+    for section in sections:
+        out.extend(b"\0" * (_align(len(out)) - len(out)))
+        out.extend(section)
+    return bytes(out)
+
+
+def compile_frame(df: pd.DataFrame) -> bytes:
+    return compile_columns(
+        questions=df["question"].astype(str).tolist(),
+        choices=df[CHOICE_COLUMNS].astype(str).to_numpy().tolist(),
+        answers=df["answer"].astype(int).tolist(),
+        genres=df["genre"].astype(str).str.lower().tolist(),
+    )
 
 
-async def load_questions_from_csv(csv_path: str) -> None:
-    """Load questions from a CSV file into the QUESTION_BANK."""
+def compile_csv(csv_path: str, bank_path: str) -> None:
+    """Build step: compile a question CSV into a bank file the server can map."""
     df = pd.read_csv(csv_path)
+    if df.empty:
+        # never replace a compiled bank with one the server would refuse
+        raise ValueError(f"no questions in {csv_path}")
+    data = compile_frame(df)
+    # write then rename, so a worker never maps a half written file
+    tmp_path = f"{bank_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, bank_path)
+
+
+class QuestionBank:
+    """
+    Read-only question store over a compiled bank buffer.
+
+    Usually the buffer is a memory-mapped file, so startup maps instead of
+    parsing text, and every worker process shares one page-cache copy.
+    Rows are indexed by genre in the file, so sampling k questions costs
+    O(k) whatever the size of the bank. `Question` tuples are only built
+    for the rows actually sampled. Each row also carries its question frame
+    pre-encoded at build time, so sessions never re-encode question text.
+    """
+
+    def __init__(self, buf: Union[bytes, mmap.mmap]):
+        self._buf = buf
+        magic, version, n_choices, rows, n_genres = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION or n_choices != N_CHOICES:
+            raise ValueError("not a compiled question bank, or an outdated one")
+
+        view = memoryview(buf)
+        pos = _HEADER.size
+
+        def section(fmt: str, count: int) -> memoryview:
+            nonlocal pos
+            start = _align(pos)
+            pos = start + count * struct.calcsize(fmt)
+            return view[start:pos].cast(fmt)
+
+        self._offsets = section("I", n_genres + rows * STRINGS_PER_ROW + 1)
+        genre_start = section("I", n_genres + 1)
+        genre_rows = section("I", rows)
+        self._genre_ids = section("H", rows)
+        self._answers = section("B", rows)
+        self._heap = view[_align(pos) :]
+        self._rows = rows
+        self._n_genres = n_genres
+
+        self.genre_names: List[str] = [self._string(g) for g in range(n_genres)]
+        self.by_genre: Dict[str, memoryview] = {
+            name: genre_rows[genre_start[g] : genre_start[g + 1]]
+            for g, name in enumerate(self.genre_names)
+        }
+
+    @classmethod
+    def open(cls, bank_path: str) -> "QuestionBank":
+        with open(bank_path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self) -> int:
+        return self._rows
 
-    formatted_questions = []
-    for _, row in df.iterrows():
-        choices = [row["a"], row["b"], row["c"], row["d"]]
-        question = Question(
-            question=row["question"],
-            choices=choices,
-            answer=int(row["answer"]),
-            genre=row["genre"],
+    def _string(self, k: int) -> str:
+        return str(self._heap[self._offsets[k] : self._offsets[k + 1]], "utf-8")
+
+    def get(self, row: int) -> Question:
+        first = self._n_genres + row * STRINGS_PER_ROW
+        return Question(
+            question=self._string(first),
+            choices=[self._string(first + 1 + c) for c in range(N_CHOICES)],
+            answer=self._answers[row],
+            genre=self.genre_names[self._genre_ids[row]],
+            frame=self._string(first + 1 + N_CHOICES),
+        )
+
+    def sample(self, amount: int, genre: Optional[str] = None) -> List[Question]:
+        rows: Sequence[int] = (
+            self.by_genre.get(genre.lower(), ()) if genre else range(len(self))
         )
-        formatted_questions.append(question)
+        if not rows:
+            return []
+        # sampling a range / memoryview doesn't copy the population
+        return [self.get(r) for r in random.sample(rows, min(amount, len(rows)))]
+
+
+# swapped whole on every (re)load, sessions sample from whichever bank is
+# current when they start and keep those questions until they end
+QUESTION_BANK = QuestionBank(compile_columns([], [], [], []))
+# bumped on every publish, 0 until the first bank is loaded
+bank_version = 0
+
+# set once a bank is loaded, matchmaking waits on it
+bank_loaded = asyncio.Event()
+
+# the startup load, the file watcher and the admin trigger never overlap
+_load_lock = asyncio.Lock()
 
-    QUESTION_BANK.clear()
-    QUESTION_BANK.extend(formatted_questions)
-    print(f"Loaded {len(QUESTION_BANK)} questions from {csv_path}.")
+# (mtime_ns, size) of a file, None when it does not exist
+Stamp = Optional[Tuple[int, int]]
+
+# bank path -> (csv, bank) stamps of its last successful load
+_loaded_stamps: Dict[str, Tuple[Stamp, Stamp]] = {}
+
+
+def _publish(bank: QuestionBank, source: str):
+    global QUESTION_BANK, bank_version
+    if not len(bank):
+        # every game would end at once, matchmaking stays closed instead
+        raise ValueError(f"refusing to load an empty question bank from {source}")
+    QUESTION_BANK = bank
+    bank_version += 1
+    bank_loaded.set()
+    log.info(
+        "question_bank_loaded",
+        questions=len(bank),
+        source=source,
+        version=bank_version,
+    )
+
+
+def _is_current(csv_path: str, bank_path: str) -> bool:
+    """The compiled bank exists, is newer than the CSV and in the current format."""
+    if not os.path.exists(bank_path):
+        return False
+    if os.path.getmtime(bank_path) < os.path.getmtime(csv_path):
+        return False
+    with open(bank_path, "rb") as f:
+        header = f.read(_HEADER.size)
+    return len(header) == _HEADER.size and _HEADER.unpack(header)[:2] == (
+        MAGIC,
+        VERSION,
+    )
+
+
+def _ensure_compiled(csv_path: str, bank_path: str) -> None:
+    if not _is_current(csv_path, bank_path):
+        compile_csv(csv_path, bank_path)
+
+
+def _bank_path(csv_path: str, bank_path: Optional[str]) -> str:
+    return bank_path or os.path.splitext(csv_path)[0] + ".qbank"
+
+
+async def load_question_bank(csv_path: str, bank_path: Optional[str] = None) -> None:
+    """
+    Map the compiled question bank into the QUESTION_BANK, replacing the
+    current one. The bank is compiled from the CSV first if it is missing
+    or stale, normally `scripts/build_questions.sh` has done that already.
+    Compiling and mapping both run off the event loop, games carry on
+    until the new bank is swapped in.
+    """
+    bank_path = _bank_path(csv_path, bank_path)
+    async with _load_lock:
+        await asyncio.to_thread(_ensure_compiled, csv_path, bank_path)
+        stamps = (_stamp(csv_path), _stamp(bank_path))
+        bank = await asyncio.to_thread(QuestionBank.open, bank_path)
+        _publish(bank, bank_path)
+        _loaded_stamps[bank_path] = stamps
+
+
+def _stamp(path: str) -> Stamp:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+async def watch_question_bank(
+    csv_path: str, bank_path: Optional[str] = None, interval: float = 5.0
+) -> None:
+    """
+    Reload the question bank whenever the CSV or the compiled bank changes.
+    A change is only picked up once the file has stayed the same for one
+    `interval`, so a file still being written is never loaded. With several
+    workers, the first one to see a new CSV compiles it, the others pick up
+    the new bank file.
+    """
+    bank_path = _bank_path(csv_path, bank_path)
+    seen = pending = (_stamp(csv_path), _stamp(bank_path))
+    loaded = _loaded_stamps.get(bank_path)
+    while True:
+        await asyncio.sleep(interval)
+        if _loaded_stamps.get(bank_path) != loaded:
+            # loaded meanwhile, eg. by the admin trigger, those files are not news
+            seen = loaded = _loaded_stamps[bank_path]
+        current = (_stamp(csv_path), _stamp(bank_path))
+        if current == seen or current != pending:
+            pending = current
+            continue
+        try:
+            await load_question_bank(csv_path, bank_path)
+        except Exception:
+            log.exception("question_bank_reload_failed", source=csv_path)
+        # includes the bank this worker may just have compiled
+        seen = pending = (_stamp(csv_path), _stamp(bank_path))
 
 
 def get_random_questions(
     amount: int = 10, genre: Optional[str] = None
 ) -> List[Question]:
     """Retrieve a list of random questions, optionally filtered by genre."""
-    filtered = (
-        [q for q in QUESTION_BANK if q.genre.lower() == genre.lower()]
-        if genre
-        else QUESTION_BANK
-    )
-    if not filtered:
-        return []
-    return random.sample(filtered, min(amount, len(filtered)))
+    return QUESTION_BANK.sample(amount, genre)
+
+
+if __name__ == "__main__":
+    # python -m app.utils.prepare_questions <questions.csv> <questions.qbank>
+    compile_csv(sys.argv[1], sys.argv[2])
+    print(f"Compiled {sys.argv[1]} -> {sys.argv[2]}")
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ProfileCache:
+    """
+    Bounded LRU cache of player profiles with a TTL.
+
+    Concurrent loads of the same uid share one database read (single-flight),
+    and writers keep the cached copy coherent through `update`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # uid -> (expires_at, profile), least recently used first
+        self._entries: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, uid: str) -> Optional[Dict]:
+        entry = self._entries.get(uid)
+        if entry is None:
+            return None
+        expires_at, pdata = entry
+        if expires_at < time.monotonic():
+            del self._entries[uid]
+            return None
+        self._entries.move_to_end(uid)
+        return pdata
+
+    def put(self, uid: str, pdata: Dict):
+        self._entries[uid] = (time.monotonic() + self.ttl, pdata)
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def update(self, uid: str, **fields):
+        """Apply a write to the cached profile, if there is one."""
+        pdata = self.get(uid)
+        if pdata is not None:
+            pdata.update(fields)
+
+    def invalidate(self, uid: str):
+        self._entries.pop(uid, None)
+
+    async def load(self, uid: str, loader: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Return the cached profile, or load it once no matter how many callers ask."""
+        pdata = self.get(uid)
+        if pdata is not None:
+            return pdata
+
+        task = self._inflight.get(uid)
+        if task is None:
+            # the load runs as its own task, so a caller cancelled mid-load
+            # neither cancels it nor leaves the other callers waiting on it
+            task = self._inflight[uid] = asyncio.ensure_future(self._load(uid, loader))
+        return await asyncio.shield(task)
+
+    async def _load(self, uid: str, loader: Callable[[], Awaitable[Dict]]) -> Dict:
+        try:
+            pdata = await loader()
+            self.put(uid, pdata)
+            return pdata
+        finally:
+            del self._inflight[uid]
@@ -0,0 +1,125 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from google.cloud.firestore_v1 import AsyncClient
+
+from app.utils.fake_firestore import FakeFirestore
+from app.utils.log import get_logger
+from app.utils.metrics import FIRESTORE_COMMIT_RESULTS
+
+log = get_logger("results")
+
+# firestore rejects batches with more writes than this
+MAX_BATCH_WRITES = 500
+
+
+class ResultWriter:
+    """
+    Write-behind pipeline for player documents updated by finished games.
+
+    `submit` only records the write, so a session never waits on the database.
+    Writes to the same player are merged, and the background `run` loop
+    commits everything pending in batches of up to 500 with retries and
+    exponential backoff. `close` flushes what is left on shutdown.
+
+    Until a write is committed, readers of the database see the old document,
+    `pending` / `uncommitted` let them overlay what is still on its way.
+    """
+
+    def __init__(
+        self,
+        db: AsyncClient | FakeFirestore,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        collection: str = "players",
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.collection = collection
+        # uid -> merged payload waiting to be committed
+        self._pending: Dict[str, Dict] = {}
+        # uid -> payload taken by a flush, committing right now
+        self._inflight: Dict[str, Dict] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, uid: str, payload: Dict):
+        """Queue a merge-write of `payload` into the player's document."""
+        self._pending[uid] = self._pending.get(uid, {}) | payload
+        self._wakeup.set()
+
+    def pending(self, uid: str) -> Optional[Dict]:
+        """The player's writes not committed yet, merged, or None."""
+        inflight, pending = self._inflight.get(uid), self._pending.get(uid)
+        if inflight is None:
+            return pending
+        return inflight | (pending or {})
+
+    def uncommitted(self) -> Set[str]:
+        """Uids whose documents are behind their latest results."""
+        return self._pending.keys() | self._inflight.keys()
+
+    async def run(self):
+        while not self._closed:
+            await self._wakeup.wait()
+            # give other games finishing around now a chance to join the batch
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Commit everything pending right now."""
+        async with self._flush_lock:
+            items = list(self._pending.items())
+            self._pending.clear()
+            for i in range(0, len(items), MAX_BATCH_WRITES):
+                await self._commit(items[i : i + MAX_BATCH_WRITES])
+
+    async def _commit(self, chunk: List[Tuple[str, Dict]]):
+        self._inflight.update(chunk)
+        try:
+            await self._commit_with_retries(chunk)
+        finally:
+            for uid, _ in chunk:
+                del self._inflight[uid]
+
+    async def _commit_with_retries(self, chunk: List[Tuple[str, Dict]]):
+        for attempt in range(self.max_retries):
+            try:
+                # the real client's batch or the fake's, fed its own references
+                batch: Any = self.db.batch()
+                for uid, payload in chunk:
+                    doc = self.db.collection(self.collection).document(uid)
+                    batch.set(doc, payload, merge=True)
+                with FIRESTORE_COMMIT_RESULTS.time():
+                    await batch.commit()
+                return
+            except Exception as e:
+                log.warning(
+                    "result_commit_failed",
+                    attempt=attempt + 1,
+                    writes=len(chunk),
+                    error=str(e),
+                )
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+        # out of retries - put the writes back (newer writes win) for the next flush
+        for uid, payload in chunk:
+            self._pending[uid] = payload | self._pending.get(uid, {})
+        if not self._closed:
+            self._wakeup.set()
+
+    async def close(self):
+        """Stop the background loop and flush what is left."""
+        self._closed = True
+        self._wakeup.set()
+        await self.flush()
+        if self._pending:
+            log.error("result_writes_lost", writes=len(self._pending))
@@ -0,0 +1,104 @@
+"""
+Benchmark GeoIP lookups: the old per-address string cache against the
+network-prefix cache, both over the same reader mode.
+
+The address stream mimics players: a pool of client /24 networks with a
+skewed popularity, random hosts inside them.
+
+usage (from backend/): poetry run python -m scripts.bench_geoip <GeoLite2-Country.mmdb>
+"""
+
+import argparse
+import ipaddress
+import random
+import time
+from functools import lru_cache
+from typing import Callable, List
+
+import geoip2.errors
+from geoip2.database import MODE_AUTO, MODE_MMAP, MODE_MMAP_EXT, Reader
+
+from app.utils.network_cache import NetworkCache
+
+
+def address_stream(count: int, networks: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    pool = [
+        ipaddress.IPv4Address(rng.randrange(1 << 24, 223 << 24) & ~0xFF)
+        for _ in range(networks)
+    ]
+    # a few networks (big ISPs, campuses) bring most of the players
+    weights = [1 / (rank + 1) for rank in range(networks)]
+    picks = rng.choices(pool, weights, k=count)
+    return [str(net + rng.randrange(1, 255)) for net in picks]
+
+
+MODES = {"auto": MODE_AUTO, "mmap_ext": MODE_MMAP_EXT, "mmap": MODE_MMAP}
+
+
+def string_cache(db_path: str, mode: int, maxsize: int):
+    reader = Reader(db_path, mode=mode)
+
+    @lru_cache(maxsize=maxsize)
+    def lookup(ip: str):
+        try:
+            return reader.country(ip).country.iso_code
+        except geoip2.errors.AddressNotFoundError:
+            return "IDK"
+
+    def stats():
+        info = lookup.cache_info()
+        return info.hits, info.misses, info.currsize
+
+    return lookup, stats
+
+
+def network_cache(db_path: str, mode: int, maxsize: int):
+    reader = Reader(db_path, mode=mode)
+    cache = NetworkCache(maxsize)
+
+    def lookup(ip: str):
+        found, country = cache.get(ip)
+        if found:
+            return country
+        try:
+            record = reader.country(ip)
+            country, network = record.country.iso_code, record.traits.network
+        except geoip2.errors.AddressNotFoundError as e:
+            country, network = "IDK", e.network
+        cache.put(network, country)
+        return country
+
+    def stats():
+        return cache.hits, cache.misses, len(cache)
+
+    return lookup, stats
+
+
+def run(name: str, lookup: Callable, stats: Callable, stream: List[str]):
+    started = time.perf_counter()
+    for ip in stream:
+        lookup(ip)
+    elapsed = time.perf_counter() - started
+    hits, misses, entries = stats()
+    print(
+        f"{name:<15} {len(stream) / elapsed:>12,.0f} lookups/s"
+        f"  hit rate {hits / max(1, hits + misses):6.1%}"
+        f"  entries {entries:>8,}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("db_path")
+    parser.add_argument("--lookups", type=int, default=500_000)
+    parser.add_argument("--networks", type=int, default=20_000)
+    parser.add_argument("--cache-size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", choices=MODES, default="auto")
+    args = parser.parse_args()
+
+    mode = MODES[args.mode]
+    stream = address_stream(args.lookups, args.networks, args.seed)
+    run("string lru", *string_cache(args.db_path, mode, args.cache_size), stream)
+    run("network prefix", *network_cache(args.db_path, mode, args.cache_size), stream)
@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+
+# Compile the question CSV into the memory-mappable bank the server loads at startup
+# usage: bash scripts/build_questions.sh [questions.csv] [questions.qbank]
+
+cd "$(dirname "$0")/.."
+
+CSV_PATH=${1:-app/data/combined_quiz.csv}
+BANK_PATH=${2:-${CSV_PATH%.*}.qbank}
+
+poetry run python -m app.utils.prepare_questions "$CSV_PATH" "$BANK_PATH"
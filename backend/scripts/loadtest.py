@@ -0,0 +1,240 @@
+"""
+Load generator for the /play endpoint.
+
+Opens N synthetic players against a server started in TEST mode
+(`bash scripts/start.sh --test`), which accepts any `test-*` token as its
+own uid. Every player queues, plays games with a random answer delay, and
+reconnects for another game until the run is over. At the end it reports
+time-to-match, question -> reveal latency, dropped frames, sessions per core
+and the bytes a player receives per game, over json or `--protocol msgpack`.
+
+usage: python scripts/loadtest.py --players 2000 --duration 120 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import msgpack
+import websockets
+
+# server close codes worth telling apart in the report
+CLOSE_CODES = {4401: "rejected", 4408: "slow consumer", 4503: "starting up"}
+
+MSGPACK_SUBPROTOCOL = "trividuel.msgpack.v1"
+# message codes of the msgpack protocol, see app/schemas/protocol.py
+FOUND, QUESTION, REVEAL, END, PING, PONG, ANSWER = 2, 4, 5, 6, 7, 8, 11
+
+
+def read_frame(raw) -> Optional[Dict]:
+    """The parts of a server frame the load generator needs, in the json shape."""
+    if isinstance(raw, bytes):
+        msg = msgpack.unpackb(raw)
+        code = msg[0]
+        if code == PING:
+            return {"type": "ping"}
+        if code == FOUND:
+            return {"type": "game", "message": "found", "extra": {"session_id": msg[1]}}
+        if code == QUESTION:
+            return {"type": "game", "message": "question", "extra": {"index": msg[1]}}
+        if code == REVEAL:
+            return {"type": "game", "message": "reveal"}
+        if code == END:
+            return {"type": "game", "message": "end", "extra": {"reason": msg[2]}}
+        return {}
+    if not raw.startswith("{"):
+        # plain text notices sent before a close
+        return None
+    return json.loads(raw)
+
+
+class Stats:
+    def __init__(self):
+        self.time_to_match: List[float] = []
+        # question frame -> reveal frame, as seen by each player
+        self.question_to_reveal: List[float] = []
+        # last answer of the pair -> reveal frame, the server side of the round trip
+        self.answer_to_reveal: List[float] = []
+        # session ids, both players of a session report it
+        self.sessions_started: set = set()
+        self.sessions_finished: set = set()
+        # bytes received by a player over a whole game, after decompression
+        self.game_bytes: List[int] = []
+        self.dropped = Counter()
+        self.closes = Counter()
+        # (session, question index) -> answer times of both players
+        self._answers: Dict[tuple, List[float]] = defaultdict(list)
+        self._revealed: set = set()
+
+    def answered(self, session: str, index: int, at: float):
+        self._answers[(session, index)].append(at)
+
+    def revealed(self, session: str, index: int, at: float):
+        key = (session, index)
+        if key in self._revealed:
+            return
+        self._revealed.add(key)
+        answers = self._answers.pop(key, [])
+        # only a round both players answered was revealed by the last answer
+        if len(answers) == 2:
+            self.answer_to_reveal.append(at - max(answers))
+
+
+def percentiles(values: List[float], points=(50, 90, 99)) -> Dict[str, float]:
+    if not values:
+        return {f"p{p}": float("nan") for p in points}
+    ordered = sorted(values)
+    return {
+        f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+        for p in points
+    }
+
+
+async def play_game(url: str, uid: str, args, stats: Stats, deadline: float) -> bool:
+    """One connection, one game. Returns False if the player should back off."""
+    session: Optional[str] = None
+    questions: Dict[int, float] = {}
+    last_index = -1
+    received = 0
+    queued_at = time.monotonic()
+    binary = args.protocol == "msgpack"
+
+    async def answer(index: int):
+        await asyncio.sleep(random.uniform(args.answer_min, args.answer_max))
+        if random.random() < args.skip:
+            # let this one time out
+            return
+        choice = random.randrange(4)
+        if binary:
+            await ws.send(msgpack.packb([ANSWER, choice]))
+        else:
+            await ws.send(json.dumps({"type": "answer", "choice": choice}))
+        stats.answered(session, index, time.monotonic())
+
+    try:
+        async with websockets.connect(
+            f"{url}?token={uid}",
+            open_timeout=30,
+            max_queue=None,
+            subprotocols=[MSGPACK_SUBPROTOCOL] if binary else None,
+        ) as ws:
+            async for raw in ws:
+                received += len(raw)
+                msg = read_frame(raw)
+                if msg is None:
+                    continue
+                now = time.monotonic()
+                kind, message = msg.get("type"), msg.get("message")
+                extra = msg.get("extra") or {}
+
+                if kind == "ping":
+                    await ws.send(
+                        msgpack.packb([PONG]) if binary else '{"type":"pong"}'
+                    )
+                elif kind != "game":
+                    continue
+                elif message == "found":
+                    session = extra["session_id"]
+                    stats.time_to_match.append(now - queued_at)
+                    stats.sessions_started.add(session)
+                elif message == "question":
+                    index = extra["index"]
+                    if index != last_index + 1:
+                        stats.dropped["question"] += index - last_index - 1
+                    last_index = index
+                    questions[index] = now
+                    asyncio.create_task(answer(index))
+                elif message == "reveal":
+                    asked = questions.pop(last_index, None)
+                    if asked is None:
+                        stats.dropped["question"] += 1
+                        continue
+                    stats.question_to_reveal.append(now - asked)
+                    stats.revealed(session, last_index, now)
+                elif message == "end":
+                    stats.sessions_finished.add(session)
+                    stats.game_bytes.append(received)
+                    if extra.get("reason") != "Opponent Left":
+                        # questions never revealed - the reveal frame went missing
+                        stats.dropped["reveal"] += len(questions)
+                    return True
+
+                if time.monotonic() > deadline and session is None:
+                    # run is over, stop waiting for a match
+                    return True
+    except websockets.ConnectionClosed as e:
+        code = e.rcvd.code if e.rcvd else None
+        stats.closes[CLOSE_CODES.get(code, str(code))] += 1
+    except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as e:
+        stats.closes[type(e).__name__] += 1
+    return False
+
+
+async def player(url: str, uid: str, args, stats: Stats, deadline: float):
+    while time.monotonic() < deadline:
+        if not await play_game(url, uid, args, stats, deadline):
+            await asyncio.sleep(1)
+
+
+def report(stats: Stats, elapsed: float, args) -> Dict:
+    per_core = len(stats.sessions_finished) / elapsed / args.workers
+    games = len(stats.game_bytes)
+    return {
+        "players": args.players,
+        "protocol": args.protocol,
+        "elapsed_s": round(elapsed, 1),
+        "sessions_started": len(stats.sessions_started),
+        "sessions_finished": len(stats.sessions_finished),
+        "sessions_per_core_per_s": round(per_core, 3),
+        "time_to_match_ms": percentiles(stats.time_to_match),
+        "question_to_reveal_ms": percentiles(stats.question_to_reveal),
+        "answer_to_reveal_ms": percentiles(stats.answer_to_reveal),
+        "bytes_per_game": round(sum(stats.game_bytes) / games) if games else None,
+        "dropped_frames": dict(stats.dropped),
+        "closes": dict(stats.closes),
+    }
+
+
+async def main(args):
+    stats = Stats()
+    run = uuid.uuid4().hex[:6]
+    started = time.monotonic()
+    deadline = started + args.duration
+    tasks = []
+    for i in range(args.players):
+        uid = f"test-{run}-{i}"
+        tasks.append(asyncio.create_task(player(args.url, uid, args, stats, deadline)))
+        # spread the connects over the ramp instead of one thundering herd
+        await asyncio.sleep(args.ramp / args.players)
+
+    # games still running at the deadline are allowed to finish
+    await asyncio.wait(tasks, timeout=args.duration + args.grace)
+    for t in tasks:
+        t.cancel()
+
+    result = report(stats, time.monotonic() - started, args)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="ws://localhost:5678/play")
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds to connect all")
+    parser.add_argument("--grace", type=float, default=60, help="seconds to finish")
+    parser.add_argument("--answer-min", type=float, default=0.5)
+    parser.add_argument("--answer-max", type=float, default=3.0)
+    parser.add_argument("--skip", type=float, default=0.05, help="unanswered ratio")
+    parser.add_argument("--workers", type=int, default=1, help="server workers")
+    parser.add_argument("--protocol", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--output", help="also write the report to this json file")
+    asyncio.run(main(parser.parse_args()))
@@ -21,5 +21,15 @@ fi
 
 export $(grep -v '^#' .env | xargs)
 
-# run API bot
-poetry run uvicorn app.main:app --host 0.0.0.0 --port 5678
\ No newline at end of file
+WORKERS=${WORKERS:-1}
+if [ "$WORKERS" -gt 1 ]; then
+    # several workers share players, queue and sessions through the state hub
+    export STATE_BACKEND="shared"
+    poetry run python -m app.state.hub &
+    trap "kill $!" EXIT
+fi
+
+# run API bot, frames are compressed for clients negotiating permessage-deflate,
+# client messages are a few bytes so anything past 16KB is refused by the server
+poetry run uvicorn app.main:app --host 0.0.0.0 --port 5678 --workers "$WORKERS" \
+    --ws websockets --ws-per-message-deflate true --ws-max-size 16384
\ No newline at end of file